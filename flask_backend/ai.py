@@ -1,35 +1,124 @@
+import hashlib
+import logging
+import os
 import re
+import threading
 import emoji
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-import nltk
 from cleantext import clean
-from transformers import pipeline
+from batching import MicroBatcher
+from cache import get_cache
+from metrics import registry
+
+MODEL_NAME = os.getenv("SENTIMENT_MODEL", "cardiffnlp/twitter-roberta-base-sentiment-latest")
+# A directory produced by `python ai.py download <dir>`; loaded without touching the network.
+MODEL_DIR = os.getenv("SENTIMENT_MODEL_DIR")
+OFFLINE = os.getenv("SENTIMENT_OFFLINE", "0") == "1" or bool(MODEL_DIR)
+QUANTIZE = os.getenv("SENTIMENT_QUANTIZE", "0") == "1"
+# "torch" runs the transformers pipeline; "onnx" runs an ONNX Runtime export (see onnx_backend.py).
+BACKEND = os.getenv("SENTIMENT_BACKEND", "torch").lower()
+BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "16"))
+BATCH_WAIT_MS = float(os.getenv("SENTIMENT_BATCH_WAIT_MS", "10"))
+PREPROCESS_CACHE_SIZE = int(os.getenv("PREPROCESS_CACHE_SIZE", "10000"))
+RESULT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "10000"))
+
+log = logging.getLogger(__name__)
 
 # ==========================================
-# Setup NLTK and model
+# Lazy setup of NLTK and model
 # ==========================================
-print("🔧 Setting up NLP environment...")
-nltk.download("punkt_tab", quiet=True)
-nltk.download("stopwords", quiet=True)
+# Nothing heavy happens at import time: stopwords and the model are loaded on
+# first use (or by warmup()), once per process.
+_stop_words_lock = threading.Lock()
+_analyzer_lock = threading.Lock()
+_stop_words = None
+_analyzer = None
+
+def get_stop_words() -> set:
+    global _stop_words
+    if _stop_words is None:
+        with _stop_words_lock:
+            if _stop_words is None:
+                import nltk
+                from nltk.corpus import stopwords
+                try:
+                    words = stopwords.words("english")
+                except LookupError:
+                    if OFFLINE:
+                        raise
+                    nltk.download("stopwords", quiet=True)
+                    words = stopwords.words("english")
+                _stop_words = set(words)
+    return _stop_words
+
+def load_model(source=None, quantize=None):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+    source = source or MODEL_DIR or MODEL_NAME
+    quantize = QUANTIZE if quantize is None else quantize
+    log.info("Loading Hugging Face model %s%s", source, " (int8)" if quantize else "")
+    tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=OFFLINE)
+    model = AutoModelForSequenceClassification.from_pretrained(source, local_files_only=OFFLINE)
+    if quantize:
+        import torch
+        # Dynamic int8 quantization of the Linear layers; CPU only.
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    analyzer = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, device=-1)
+    log.info("Loaded Hugging Face model %s", source)
+    return analyzer
+
+def get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                if BACKEND == "onnx":
+                    import onnx_backend
+                    _analyzer = onnx_backend.load(MODEL_DIR or MODEL_NAME, quantize=QUANTIZE, offline=OFFLINE)
+                elif BACKEND == "torch":
+                    _analyzer = load_model()
+                else:
+                    raise ValueError(f"Unknown sentiment backend: {BACKEND}")
+    return _analyzer
+
+def warmup():
+    # Loads everything and runs one prediction so the first request doesn't pay for it.
+    get_stop_words()
+    _predict([preprocess_text("warmup")])
 
-stop_words = set(stopwords.words("english"))
+def download(target_dir, source=None):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
-print("🚀 Loading Hugging Face model (CardiffNLP Twitter RoBERTa)...")
-sentiment_analyzer = pipeline(
-    "sentiment-analysis",
-    model="cardiffnlp/twitter-roberta-base-sentiment-latest"
-)
-print("✅ Model loaded successfully!\n")
+    source = source or MODEL_NAME
+    AutoTokenizer.from_pretrained(source).save_pretrained(target_dir)
+    AutoModelForSequenceClassification.from_pretrained(source).save_pretrained(target_dir)
+    get_stop_words()
 
 # ==========================================
 # Preprocessing function
 # ==========================================
-def preprocess_text(text: str) -> str:
+_STRIP = re.compile(r"[^a-zA-Z\s:]+")
+# After stripping only letters, whitespace and colons are left, and of
+# word_tokenize's rules only these fire on such text, applied in its order.
+# A colon also swallows the character after it, so "::fire:" (two adjacent
+# emoji) gives ":", ":fire", ":" exactly as word_tokenize does.
+_COLON = re.compile(r":([^\d])")
+_COLON_END = re.compile(r":$")
+_CONTRACTIONS = [
+    re.compile(p, re.IGNORECASE)
+    for p in (r"\b(can)(not)\b", r"\b(gim)(me)\b", r"\b(gon)(na)\b", r"\b(got)(ta)\b", r"\b(lem)(me)\b", r"\b(wan)(na)(?=\s)")
+]
+
+preprocessed = get_cache("preprocess", PREPROCESS_CACHE_SIZE)
+results = get_cache("sentiment_results", RESULT_CACHE_SIZE)
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+def _normalize(text: str) -> str:
     if not text:
         return ""
 
-    text = text.lower()
     text = clean(
         text,
         fix_unicode=True,
@@ -42,24 +131,34 @@ def preprocess_text(text: str) -> str:
         no_currency_symbols=True,
         no_punct=False,
     )
-    text = emoji.demojize(text)
-    text = re.sub(r"[^a-zA-Z\s:]", "", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    tokens = word_tokenize(text)
-    tokens = [word for word in tokens if word not in stop_words]
-    return " ".join(tokens)
+    stop_words = get_stop_words()
+    return " ".join(t for t in tokenize(emoji.demojize(text)) if t not in stop_words)
+
+def tokenize(text: str) -> list:
+    # Same tokens as word_tokenize(re.sub(r"[^a-zA-Z\s:]", "", text)), without NLTK.
+    text = _COLON.sub(r" : \1", _STRIP.sub("", text))
+    text = f" {_COLON_END.sub(' : ', text)} "
+    for pattern in _CONTRACTIONS:
+        text = pattern.sub(r" \1 \2 ", text)
+    return text.split()
+
+def preprocess_text(text: str) -> str:
+    return preprocessed.get_or_load(_digest(text or ""), lambda: _normalize(text))
+
+def preprocess_many(texts: list) -> list:
+    # Each distinct text in the batch is normalized at most once.
+    keys = [_digest(t or "") for t in texts]
+    out = {}
+    for key, text in zip(keys, texts):
+        if key not in out:
+            out[key] = preprocessed.get_or_load(key, lambda: _normalize(text))
+    return [out[k] for k in keys]
 
 # ==========================================
 # Sentiment prediction
 # ==========================================
-def analyze_sentiment(text: str):
-    processed = preprocess_text(text)
-    print(f"🧹 Preprocessed: {processed}\n")
-
-    result = sentiment_analyzer(processed[:512])[0]
-    label = result["label"].lower()
-    score = result["score"]
-
+def to_rating(label: str, score: float) -> dict:
+    label = label.lower()
     sentiment, rating = "neutral", 3
     if "pos" in label:
         sentiment = "positive"
@@ -67,14 +166,69 @@ def analyze_sentiment(text: str):
     elif "neg" in label:
         sentiment = "negative"
         rating = max(1, 3 - int(score * 2))
+    return {"sentiment": sentiment, "rating": rating, "label": label, "score": score}
+
+# RoBERTa's position embeddings stop here, and the checkpoint's tokenizer does
+# not declare a model_max_length, so truncation needs an explicit length.
+MAX_TOKENS = 512
+
+def _predict(texts: list) -> list:
+    # One forward pass per batch; the tokenizer pads to the longest text and truncates to MAX_TOKENS.
+    outputs = get_analyzer()(texts, batch_size=len(texts), truncation=True, max_length=MAX_TOKENS, padding=True)
+    return [to_rating(o["label"], o["score"]) for o in outputs]
+
+batcher = MicroBatcher(_predict, max_batch_size=BATCH_SIZE, max_wait=BATCH_WAIT_MS / 1000)
+registry.register_histogram("sentiment_batch_size", "Texts per model forward pass.", batcher.batch_size)
+registry.register_histogram("sentiment_queue_seconds", "Time a text waits for its micro-batch.", batcher.queue_latency)
+
+def analyze_sentiment(text: str) -> dict:
+    clean_text = preprocess_text(text)
+    key = _digest(clean_text)
+    result = results.get(key)
+    if result is None:
+        result = batcher.submit(clean_text).result()
+        results.set(key, result)
+    return dict(result)
 
-    print(f"🔍 Model output: {result}")
-    print(f"✅ Final Sentiment: {sentiment}, Rating: {rating}/5 ({score:.2%} confidence)\n")
+def analyze_many(texts: list) -> list:
+    # Results are keyed on the preprocessed text, so repeats and near-duplicates
+    # that normalize to the same string never reach the model.
+    clean_texts = preprocess_many(texts)
+    keys = [_digest(t) for t in clean_texts]
+    found, missing = {}, {}
+    for key, clean_text in zip(keys, clean_texts):
+        if key in found or key in missing:
+            continue
+        result = results.get(key)
+        if result is None:
+            missing[key] = clean_text
+        else:
+            found[key] = result
+    if missing:
+        for key, result in zip(missing, batcher.map(list(missing.values()))):
+            results.set(key, result)
+            found[key] = result
+    return [dict(found[k]) for k in keys]
+
+def batch_stats() -> dict:
+    return batcher.stats()
+
+def cache_stats() -> dict:
+    return {"preprocess": preprocessed.stats(), "results": results.stats()}
 
 # ==========================================
 # Tests
 # ==========================================
 if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) > 2 and sys.argv[1] == "download":
+        download(sys.argv[2])
+        print(f"📁 Saved {MODEL_NAME} to {sys.argv[2]}")
+        sys.exit(0)
+
     samples = [
         "This app is absolutely amazing 🔥🔥 I love the design!",
         "Ugh, it's so buggy and laggy 😡 hate it.",
@@ -85,5 +239,11 @@ if __name__ == "__main__":
 
     for s in samples:
         print("💬 Input:", s)
-        analyze_sentiment(s)
+        print(f"🧹 Preprocessed: {preprocess_text(s)}")
+        result = analyze_sentiment(s)
+        print(f"✅ Final Sentiment: {result['sentiment']}, Rating: {result['rating']}/5 ({result['score']:.2%} confidence)")
         print("=" * 60)
+
+    print("📦 Batched:", analyze_many(samples * 4))
+    print("📊 Batch stats:", batch_stats())
+    print("🗃️ Cache stats:", cache_stats())
@@ -1,41 +1,155 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import psycopg2
+import psycopg2.errors
 import uuid
 import hashlib
+import hmac
+import ipaddress
 import json
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
 from datetime import datetime
-from textblob import TextBlob
+import events
+import lookups
 from blockchain import Blockchain
-import os
+from bulk import BulkError, ingest_feedback, ingest_opinions, parse_rows, prepare_feedback, prepare_opinions
+from cache import cache_stats, start_invalidation_listener
+from db import get_conn, get_pool, listener, round_trips
+import metrics
+from metrics import registry
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, Page, PageError, decode_cursor, list_response
+from profiler import profiler
+from schema import backfill_analytics, ensure_schema
+from sentiment import Scorer
+from submissions import insert_feedback, insert_opinion, insert_pending_opinion
+from verify import ChainVerifier
+from worker import ScoringWorkers
+
+ASYNC_SCORING = os.getenv("ASYNC_SCORING", "0") == "1"
+# Debug header for bench/loadtest.py; off unless the server is started with it.
+DB_ROUND_TRIP_HEADER = os.getenv("DB_ROUND_TRIP_HEADER", "0") == "1"
+# /metrics needs `Authorization: Bearer <METRICS_TOKEN>` when a token is set,
+# and is otherwise only served to clients in METRICS_ALLOW.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOW = [ipaddress.ip_network(n.strip()) for n in os.getenv("METRICS_ALLOW", "127.0.0.1/32,::1/128").split(",") if n.strip()]
 
-blockchain = Blockchain()
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "25"))
 
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+api = Blueprint("api", __name__)
 
-def get_conn():
-    return psycopg2.connect(
-        dbname=os.getenv("DB_NAME", "nulltrace"),
-        user=os.getenv("DB_USER", "postgres"),
-        password=os.getenv("DB_PASSWORD", "postgres"),
-        host=os.getenv("DB_HOST", "localhost"),
-    )
+# Per-process services, built by create_app(). Under gunicorn that happens in
+# each worker after fork, so no threads or connections cross a fork.
+blockchain = None
+verifier = None
+scorer = None
+scoring_workers = None
+_lifecycle_lock = threading.Lock()
+_running = False
 
-with get_conn() as conn:
-    with conn.cursor() as cur:
-        cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS role TEXT DEFAULT 'user';")
-        cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS password TEXT;")
+def create_app():
+    global blockchain, verifier, scorer, scoring_workers, _running
+    app = Flask(__name__)
+    # Paged lists return the next page's cursor in X-Next-Cursor.
+    CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=["X-Next-Cursor"])
+    app.register_blueprint(api)
+    with _lifecycle_lock:
+        if _running:
+            return app
+        # Model loading and other background progress goes through logging; a
+        # no-op when the server (or a test runner) already configured handlers.
+        logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+        blockchain = Blockchain()
+        verifier = ChainVerifier(blockchain)
+        scorer = Scorer.from_env()
+        scoring_workers = ScoringWorkers.from_env(scorer, blockchain)
+        # gunicorn.conf.py migrates and backfills once in the master and turns
+        # both off for its workers.
+        if os.getenv("SCHEMA_ON_START", "1") == "1":
+            ensure_schema()
+        if os.getenv("ANALYTICS_BACKFILL_ON_START", "1") == "1":
+            threading.Thread(target=backfill_analytics, name="analytics-backfill", daemon=True).start()
+        if ASYNC_SCORING:
+            scoring_workers.start()
+        start_invalidation_listener()
+        metrics.snapshots.start()
+        if os.getenv("SENTIMENT_WARMUP", "0") == "1":
+            threading.Thread(target=scorer.warmup, name="sentiment-warmup", daemon=True).start()
+        atexit.register(shutdown)
+        _running = True
+    return app
+
+def shutdown(timeout=SHUTDOWN_TIMEOUT):
+    # Drains in-flight work in dependency order: scoring workers finish their
+    # claimed batch (unfinished jobs stay leased and are retried elsewhere),
+    # the model batcher answers what is queued, the ledger seals pending
+    # blocks, and only then are the listener and pool closed.
+    global _running
+    with _lifecycle_lock:
+        if not _running:
+            return
+        _running = False
+    scoring_workers.stop(timeout)
+    scorer.shutdown(wait=True)
+    ai = sys.modules.get("ai")
+    if ai is not None:
+        ai.batcher.close(timeout)
+    blockchain.flush()
+    events.broadcaster.close()
+    listener.stop(timeout)
+    metrics.snapshots.stop(timeout)
+    get_pool().closeall()
 
 def hash_password(password: str):
     return hashlib.sha256(password.encode()).hexdigest()
 
 ADMIN_USERNAME = "admin"
 
-@app.before_request
+request_seconds = registry.histogram("http_request_duration_seconds", "Request latency by route (streamed bodies excluded).", ("method", "route", "status"))
+
+@api.before_app_request
+def start_request():
+    round_trips.count = 0
+    g.started = time.perf_counter()
+    if profiler is not None:
+        profiler.begin()
+
+@api.after_app_request
+def finish_request(response):
+    elapsed = time.perf_counter() - g.started
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request_seconds.labels(request.method, route, response.status_code).observe(elapsed)
+    # Statements issued while building the response; used by bench/loadtest.py.
+    if DB_ROUND_TRIP_HEADER:
+        response.headers["X-DB-Round-Trips"] = str(round_trips.count)
+    return response
+
+@api.teardown_app_request
+def finish_profile(exc):
+    if profiler is not None and "started" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        profiler.end(f"{request.method} {route}", time.perf_counter() - g.started)
+
+def metrics_allowed():
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return hmac.compare_digest(supplied.encode(), METRICS_TOKEN.encode())
+    try:
+        addr = ipaddress.ip_address(request.remote_addr or "")
+    except ValueError:
+        return False
+    return any(addr in network for network in METRICS_ALLOW)
+
+@api.before_app_request
 def restrict_admin_routes():
     if request.method == "OPTIONS":
         return None
+    if request.path == "/metrics" and not metrics_allowed():
+        return jsonify({"error": "Unauthorized"}), 403
     if request.path.startswith("/api/admin"):
         data = request.get_json(silent=True) or {}
         username = data.get("username") or request.args.get("username") or request.headers.get("X-Username")
@@ -44,7 +158,7 @@ def restrict_admin_routes():
         if username.lower() != ADMIN_USERNAME:
             return jsonify({"error": "Unauthorized"}), 403
 
-@app.route("/api/register", methods=["POST"])
+@api.route("/api/register", methods=["POST"])
 def register_user():
     data = request.json or {}
     username = data.get("username")
@@ -65,7 +179,7 @@ def register_user():
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/login", methods=["POST"])
+@api.route("/api/login", methods=["POST"])
 def login_user():
     data = request.json or {}
     username = data.get("username") or data.get("name")
@@ -87,7 +201,7 @@ def login_user():
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/targets", methods=["GET", "POST"])
+@api.route("/api/targets", methods=["GET", "POST"])
 def targets():
     if request.method == "GET":
         try:
@@ -111,11 +225,12 @@ def targets():
                     "INSERT INTO opinion_targets (target_id, name, category) VALUES (%s, %s, %s);",
                     (target_id, name, category),
                 )
+                lookups.target_created(cur, target_id)
         return jsonify({"success": True, "target_id": target_id})
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/opinions", methods=["GET", "POST"])
+@api.route("/api/opinions", methods=["GET", "POST"])
 def opinions():
     if request.method == "POST":
         data = request.json or {}
@@ -124,39 +239,16 @@ def opinions():
         content = data.get("content")
         if not target_id or not content:
             return jsonify({"error": "Missing target_id or content"}), 400
-        blob = TextBlob(content)
-        polarity = blob.sentiment.polarity
-        sentiment, rating = "neutral", 3
-        if polarity > 0.3:
-            sentiment, rating = "positive", 5
-        elif polarity < -0.3:
-            sentiment, rating = "negative", 1
-        opinion_id = str(uuid.uuid4())
+        if data.get("async", request.args.get("async", ASYNC_SCORING)) in (True, "1", "true"):
+            return submit_opinion_async(submitted_by, target_id, content)
+        result, engine = scorer.score(content)
+        sentiment, rating = result["sentiment"], result["rating"]
         try:
             with get_conn() as conn:
                 with conn.cursor() as cur:
-                    if submitted_by:
-                        cur.execute("SELECT 1 FROM users WHERE user_id = %s;", (submitted_by,))
-                        if cur.fetchone() is None:
-                            cur.execute("INSERT INTO users (user_id, name) VALUES (%s, %s);", (submitted_by, "AutoUser"))
-                    cur.execute("SELECT 1 FROM opinion_targets WHERE target_id = %s;", (target_id,))
-                    if cur.fetchone() is None:
+                    if not lookups.target_exists(cur, target_id):
                         return jsonify({"error": f"Invalid target_id: {target_id}"}), 400
-                    cur.execute("SELECT engine_id FROM engines LIMIT 1;")
-                    engine = cur.fetchone()
-                    if not engine:
-                        engine_id = str(uuid.uuid4())
-                        cur.execute("INSERT INTO engines (engine_id, name, version) VALUES (%s, %s, %s);", (engine_id, "DefaultEngine", "1.0"))
-                    else:
-                        engine_id = engine[0]
-                    cur.execute(
-                        "INSERT INTO opinions (opinion_id, submitted_by, target_id, content) VALUES (%s, %s, %s, %s);",
-                        (opinion_id, submitted_by, target_id, content),
-                    )
-                    cur.execute(
-                        "INSERT INTO analytics (analytics_id, result, engine_id, opinion_id, analyzed_at) VALUES (%s, %s, %s, %s, %s);",
-                        (str(uuid.uuid4()), json.dumps({"sentiment": sentiment, "rating": rating}), engine_id, opinion_id, datetime.now()),
-                    )
+                    opinion_id = insert_opinion(cur, submitted_by, target_id, content, sentiment, rating, engine)
             blockchain.add_block({
                 "type": "opinion",
                 "opinion_id": opinion_id,
@@ -166,45 +258,126 @@ def opinions():
                 "timestamp": datetime.now().isoformat()
             })
             return jsonify({"opinion_id": opinion_id, "sentiment": sentiment, "rating": rating})
+        except psycopg2.errors.ForeignKeyViolation:
+            # A cached target that has since been removed.
+            lookups.targets.invalidate(target_id)
+            return jsonify({"error": f"Invalid target_id: {target_id}"}), 400
         except psycopg2.Error as e:
             return jsonify({"error": str(e)}), 500
+    try:
+        page = Page.from_args(request.args)
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+    sql, params = page.query("""
+        SELECT json_build_object(
+                   'id', o.opinion_id,
+                   'author', o.submitted_by,
+                   'content', o.content,
+                   'timestamp', o.submitted_at,
+                   'target', t.name,
+                   'category', t.category,
+                   'sentiment', a.sentiment,
+                   'rating', a.rating
+               )::text,
+               o.submitted_at, o.opinion_id
+        FROM opinions o
+        LEFT JOIN opinion_targets t ON o.target_id = t.target_id
+        LEFT JOIN analytics a ON o.opinion_id = a.opinion_id
+        {where}
+    """, "o.submitted_at", "o.opinion_id", "o.target_id", "a.sentiment")
+    try:
+        return list_response(page, sql, params)
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+def event_stream(kinds):
+    # EventSource resends the last id it saw as Last-Event-ID on reconnect.
+    cursor = request.headers.get("Last-Event-ID") or request.args.get("cursor")
+    try:
+        cursor = decode_cursor(cursor) if cursor else None
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+    resp = events.stream(kinds, cursor)
+    if resp is None:
+        return jsonify({"error": "Too many open streams"}), 503, {"Retry-After": "5"}
+    return resp
+
+@api.route("/api/opinions/stream", methods=["GET"])
+def opinion_stream():
+    # New opinions and their (possibly later, asynchronous) scores.
+    return event_stream(events.PUBLIC_KINDS)
+
+def submit_opinion_async(submitted_by, target_id, content):
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                if not lookups.target_exists(cur, target_id):
+                    return jsonify({"error": f"Invalid target_id: {target_id}"}), 400
+                opinion_id = insert_pending_opinion(cur, submitted_by, target_id, content)
+        scoring_workers.wake()
+        return jsonify({"opinion_id": opinion_id, "status": "pending"}), 202
+    except psycopg2.errors.ForeignKeyViolation:
+        lookups.targets.invalidate(target_id)
+        return jsonify({"error": f"Invalid target_id: {target_id}"}), 400
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/api/opinions/bulk", methods=["POST"])
+def opinions_bulk():
+    try:
+        rows, errors = parse_rows(request)
+    except BulkError as e:
+        return jsonify({"error": str(e)}), 400
+    async_mode = request.args.get("async", "1" if ASYNC_SCORING else "0") in ("1", "true")
+    prepared = prepare_opinions(rows, errors, scorer, async_mode)
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                results, now = ingest_opinions(cur, prepared, errors, async_mode)
+                if not async_mode:
+                    # The whole request is sealed as one Merkle block, committed with the COPY.
+                    blockchain.add_batch([{
+                        "type": "opinion",
+                        "opinion_id": r["opinion_id"],
+                        "sentiment": r["sentiment"],
+                        "rating": r["rating"],
+                        "content": rows[r["index"]]["content"],
+                        "timestamp": now.isoformat()
+                    } for r in results if "opinion_id" in r], cur)
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    if async_mode:
+        scoring_workers.wake()
+    failed = sum(1 for r in results if "error" in r)
+    return jsonify({"inserted": len(results) - failed, "failed": failed, "results": results})
+
+@api.route("/api/opinions/<opinion_id>/status", methods=["GET"])
+def opinion_status(opinion_id):
+    try:
+        uuid.UUID(opinion_id)
+    except ValueError:
+        return jsonify({"error": f"Invalid opinion_id: {opinion_id}"}), 400
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
-                    SELECT o.opinion_id, o.submitted_by, o.content, o.submitted_at,
-                           t.name, t.category, a.result
+                    SELECT a.analytics_id, COALESCE(a.sentiment, a.result->>'sentiment'),
+                           COALESCE(a.rating, (a.result->>'rating')::int), j.status, j.attempts, j.last_error
                     FROM opinions o
-                    LEFT JOIN opinion_targets t ON o.target_id = t.target_id
-                    LEFT JOIN analytics a ON o.opinion_id = a.opinion_id
-                    ORDER BY o.submitted_at DESC;
-                """)
-                rows = cur.fetchall()
-        out = []
-        for r in rows:
-            sentiment = rating = None
-            if r[6]:
-                try:
-                    parsed = r[6] if isinstance(r[6], dict) else json.loads(r[6])
-                    sentiment = parsed.get("sentiment")
-                    rating = parsed.get("rating")
-                except Exception:
-                    pass
-            out.append({
-                "id": r[0],
-                "author": r[1],
-                "content": r[2],
-                "timestamp": r[3].isoformat(),
-                "target": r[4],
-                "category": r[5],
-                "sentiment": sentiment,
-                "rating": rating
-            })
-        return jsonify(out)
+                    LEFT JOIN analytics a ON a.opinion_id = o.opinion_id
+                    LEFT JOIN scoring_jobs j ON j.opinion_id = o.opinion_id
+                    WHERE o.opinion_id = %s;
+                """, (opinion_id,))
+                row = cur.fetchone()
+        if row is None:
+            return jsonify({"error": "Opinion not found"}), 404
+        if row[0]:
+            return jsonify({"opinion_id": opinion_id, "status": "done", "sentiment": row[1], "rating": row[2]})
+        return jsonify({"opinion_id": opinion_id, "status": row[3] or "unscored", "attempts": row[4], "error": row[5]})
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/feedback", methods=["POST"])
+@api.route("/api/feedback", methods=["POST"])
 def feedback():
     data = request.json or {}
     submitted_by = data.get("submitted_by")
@@ -212,90 +385,15 @@ def feedback():
     if not submitted_by or not content:
         return jsonify({"error": "Missing submitted_by or content"}), 400
 
-    # 🔹 Use TextBlob to infer sentiment & rating
-    blob = TextBlob(content)
-    polarity = blob.sentiment.polarity
-    sentiment, rating = "neutral", 3
-    if polarity > 0.3:
-        sentiment, rating = "positive", 5
-    elif polarity < -0.3:
-        sentiment, rating = "negative", 1
+    # 🔹 Infer sentiment & rating with the configured engine
+    result, engine = scorer.score(content)
+    sentiment, rating = result["sentiment"], result["rating"]
 
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
-                # Ensure user exists
-                cur.execute("SELECT 1 FROM users WHERE user_id = %s;", (submitted_by,))
-                if cur.fetchone() is None:
-                    cur.execute(
-                        "INSERT INTO users (user_id, name) VALUES (%s, %s);",
-                        (submitted_by, "AutoUser"),
-                    )
-
-                # Ensure feedback form exists
-                cur.execute("SELECT form_id FROM feedback_forms LIMIT 1;")
-                form = cur.fetchone()
-                if not form:
-                    form_id = str(uuid.uuid4())
-                    cur.execute(
-                        "INSERT INTO feedback_forms (form_id, created_by, title) VALUES (%s, %s, %s);",
-                        (form_id, submitted_by, "Default Feedback Form"),
-                    )
-                else:
-                    form_id = form[0]
-
-                # Create feedback response
-                response_id = str(uuid.uuid4())
-                cur.execute(
-                    "INSERT INTO feedback_responses (response_id, form_id, submitted_by, submitted_at) VALUES (%s, %s, %s, %s);",
-                    (response_id, form_id, submitted_by, datetime.now()),
-                )
-
-                # Ensure question exists
-                cur.execute("SELECT question_id FROM questions LIMIT 1;")
-                question = cur.fetchone()
-                if not question:
-                    question_id = str(uuid.uuid4())
-                    cur.execute(
-                        "INSERT INTO questions (question_id, form_id, question_text) VALUES (%s, %s, %s);",
-                        (question_id, form_id, "What is your feedback?"),
-                    )
-                else:
-                    question_id = question[0]
-
-                # Store feedback text
-                cur.execute(
-                    "INSERT INTO response_answers (answer_id, response_id, question_id, answer_text) VALUES (%s, %s, %s, %s);",
-                    (str(uuid.uuid4()), response_id, question_id, content),
-                )
-
-                # Ensure engine exists
-                cur.execute("SELECT engine_id FROM engines LIMIT 1;")
-                engine = cur.fetchone()
-                if not engine:
-                    engine_id = str(uuid.uuid4())
-                    cur.execute(
-                        "INSERT INTO engines (engine_id, name, version) VALUES (%s, %s, %s);",
-                        (engine_id, "FeedbackEngine", "1.0"),
-                    )
-                else:
-                    engine_id = engine[0]
-
-                # 🔹 Insert analytics (AI rating + sentiment)
-                cur.execute(
-                    "INSERT INTO analytics (analytics_id, result, engine_id, response_id, analyzed_at) VALUES (%s, %s, %s, %s, %s);",
-                    (
-                        str(uuid.uuid4()),
-                        json.dumps({
-                            "type": "feedback",
-                            "sentiment": sentiment,
-                            "rating": rating
-                        }),
-                        engine_id,
-                        response_id,
-                        datetime.now(),
-                    ),
-                )
+                # User, response, answer and analytics rows in one statement
+                response_id = insert_feedback(cur, submitted_by, content, sentiment, rating, engine)
 
         # Add to blockchain for immutability
         blockchain.add_block({
@@ -317,106 +415,249 @@ def feedback():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/admin/overview", methods=["GET"])
-def admin_overview():
+@api.route("/api/feedback/bulk", methods=["POST"])
+def feedback_bulk():
+    try:
+        rows, errors = parse_rows(request)
+    except BulkError as e:
+        return jsonify({"error": str(e)}), 400
+    prepared = prepare_feedback(rows, errors, scorer)
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT COUNT(*) FROM users;")
-                users = cur.fetchone()[0]
-                cur.execute("SELECT COUNT(*) FROM opinions;")
-                opinions = cur.fetchone()[0]
-                cur.execute("SELECT COUNT(*) FROM feedback_responses;")
-                feedbacks = cur.fetchone()[0]
-                cur.execute("SELECT COUNT(*) FROM opinion_targets;")
-                targets = cur.fetchone()[0]
-        return jsonify({"users": users, "opinions": opinions, "feedbacks": feedbacks, "targets": targets})
+                results, now = ingest_feedback(cur, prepared, errors)
+                blockchain.add_batch([{
+                    "type": "feedback",
+                    "feedback_id": r["response_id"],
+                    "sentiment": r["sentiment"],
+                    "rating": r["rating"],
+                    "content": rows[r["index"]]["content"],
+                    "timestamp": now.isoformat()
+                } for r in results if "response_id" in r], cur)
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
+    failed = sum(1 for r in results if "error" in r)
+    return jsonify({"inserted": len(results) - failed, "failed": failed, "results": results})
 
-@app.route("/api/admin/opinions", methods=["GET"])
-def admin_all_opinions():
+@api.route("/api/admin/overview", methods=["GET"])
+def admin_overview():
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT o.opinion_id, u.name, t.name, o.content, o.submitted_at, a.result
-                    FROM opinions o
-                    LEFT JOIN users u ON o.submitted_by = u.user_id
-                    LEFT JOIN opinion_targets t ON o.target_id = t.target_id
-                    LEFT JOIN analytics a ON o.opinion_id = a.opinion_id
-                    ORDER BY o.submitted_at DESC;
-                """)
-                rows = cur.fetchall()
-        out = []
-        for r in rows:
-            sentiment = rating = None
-            if r[5]:
-                try:
-                    parsed = r[5] if isinstance(r[5], dict) else json.loads(r[5])
-                    sentiment = parsed.get("sentiment")
-                    rating = parsed.get("rating")
-                except Exception:
-                    pass
-            out.append({
-                "opinion_id": r[0],
-                "user": "Anonymous",
-                "target": r[2] or "Unknown",
-                "content": r[3],
-                "timestamp": r[4].isoformat(),
-                "sentiment": sentiment,
-                "rating": rating
-            })
-        return jsonify(out)
+                cur.execute("SELECT name, SUM(value) FROM stats_counters GROUP BY name;")
+                counts = dict(cur.fetchall())
+        return jsonify({name: int(counts.get(name, 0)) for name in ("users", "opinions", "feedbacks", "targets")})
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/admin/feedbacks", methods=["GET"])
-def admin_all_feedbacks():
+def sentiment_trends(target_id=None):
+    bucket = request.args.get("bucket", "day")
+    if bucket not in ("hour", "day"):
+        return jsonify({"error": f"Invalid bucket: {bucket}"}), 400
+    try:
+        since = datetime.fromisoformat(request.args["since"]) if request.args.get("since") else None
+        until = datetime.fromisoformat(request.args["until"]) if request.args.get("until") else None
+        if target_id:
+            uuid.UUID(target_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    clauses, params = ["bucket_size = %s"], [bucket]
+    if target_id:
+        clauses.append("target_id = %s")
+        params.append(target_id)
+    if since:
+        clauses.append("bucket >= %s")
+        params.append(since)
+    if until:
+        clauses.append("bucket < %s")
+        params.append(until)
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        fr.response_id,
-                        fr.submitted_at,
-                        ra.answer_text,
-                        a.result
-                    FROM feedback_responses fr
-                    LEFT JOIN response_answers ra ON fr.response_id = ra.response_id
-                    LEFT JOIN analytics a ON a.response_id = fr.response_id
-                    ORDER BY fr.submitted_at DESC;
-                """)
+                cur.execute(f"""
+                    SELECT bucket, sentiment, SUM(count), SUM(rating_sum)
+                    FROM sentiment_rollups
+                    WHERE {" AND ".join(clauses)}
+                    GROUP BY bucket, sentiment
+                    ORDER BY bucket, sentiment;
+                """, params)
                 rows = cur.fetchall()
-        feedbacks = []
-        for r in rows:
-            rating = sentiment = None
-            if r[3]:
-                try:
-                    parsed = r[3] if isinstance(r[3], dict) else json.loads(r[3])
-                    rating = parsed.get("rating")
-                    sentiment = parsed.get("sentiment")
-                except Exception:
-                    pass
-            feedbacks.append({
-                "response_id": r[0],
-                "timestamp": r[1].isoformat(),
-                "content": r[2],
-                "rating": rating,
-                "sentiment": sentiment
-            })
-        return jsonify(feedbacks)
+        return jsonify([{
+            "bucket": r[0].isoformat(),
+            "sentiment": r[1],
+            "count": int(r[2]),
+            "avg_rating": round(float(r[3]) / float(r[2]), 3) if r[2] else None
+        } for r in rows])
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/api/targets/<target_id>/trends", methods=["GET"])
+def target_trends(target_id):
+    return sentiment_trends(target_id)
+
+@api.route("/api/admin/trends", methods=["GET"])
+def admin_trends():
+    # Without target_id this aggregates every target plus feedback (rolled up under the all-zero target id).
+    return sentiment_trends(request.args.get("target_id"))
+
+@api.route("/api/admin/opinions", methods=["GET"])
+def admin_all_opinions():
+    try:
+        page = Page.from_args(request.args)
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+    sql, params = page.query("""
+        SELECT json_build_object(
+                   'opinion_id', o.opinion_id,
+                   'user', 'Anonymous',
+                   'target', COALESCE(t.name, 'Unknown'),
+                   'content', o.content,
+                   'timestamp', o.submitted_at,
+                   'sentiment', a.sentiment,
+                   'rating', a.rating
+               )::text,
+               o.submitted_at, o.opinion_id
+        FROM opinions o
+        LEFT JOIN opinion_targets t ON o.target_id = t.target_id
+        LEFT JOIN analytics a ON o.opinion_id = a.opinion_id
+        {where}
+    """, "o.submitted_at", "o.opinion_id", "o.target_id", "a.sentiment")
+    try:
+        return list_response(page, sql, params)
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route("/api/admin/feedbacks", methods=["GET"])
+def admin_all_feedbacks():
+    try:
+        page = Page.from_args(request.args)
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+    sql, params = page.query("""
+        SELECT json_build_object(
+                   'response_id', fr.response_id,
+                   'timestamp', fr.submitted_at,
+                   'content', ra.answer_text,
+                   'rating', a.rating,
+                   'sentiment', a.sentiment
+               )::text,
+               fr.submitted_at, fr.response_id
+        FROM feedback_responses fr
+        LEFT JOIN response_answers ra ON fr.response_id = ra.response_id
+        LEFT JOIN analytics a ON a.response_id = fr.response_id
+        {where}
+    """, "fr.submitted_at", "fr.response_id", sentiment_col="a.sentiment")
+    try:
+        return list_response(page, sql, params)
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/admin/chain", methods=["GET"])
+@api.route("/api/admin/stream", methods=["GET"])
+def admin_stream():
+    # Opinions, scores and feedback. EventSource cannot set headers, so pass ?username=.
+    return event_stream(events.ADMIN_KINDS)
+
+@api.route("/api/admin/pool", methods=["GET"])
+def pool_stats():
+    return jsonify(get_pool().stats())
+
+@api.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.exposition(), mimetype="text/plain; version=0.0.4")
+
+@api.route("/api/admin/cache", methods=["GET"])
+def lookup_cache_stats():
+    return jsonify(cache_stats())
+
+@api.route("/api/admin/chain", methods=["GET"])
 def view_chain():
-    return jsonify(blockchain.to_dict())
+    args = request.args
+    fmt = args.get("format", "json")
+    try:
+        start = int(args.get("from", 0))
+        end = int(args["to"]) if args.get("to") else None
+        since = datetime.fromisoformat(args["since"]) if args.get("since") else None
+        until = datetime.fromisoformat(args["until"]) if args.get("until") else None
+        limit = min(int(args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE) if fmt != "ndjson" else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be positive")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {e}"}), 400
+    try:
+        tip = blockchain.get_last_block()
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    # The tip hash changes with every append, so it identifies the chain state.
+    etag = f'"{tip.hash}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers={"ETag": etag})
+    query = {"start": start, "end": end, "since": since, "until": until}
+    if fmt == "ndjson":
+        def generate():
+            for block in blockchain.store.query(**query):
+                yield json.dumps(block.to_dict()) + "\n"
+        resp = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    else:
+        try:
+            blocks = blockchain.to_dict(limit=limit + 1, **query)
+        except psycopg2.Error as e:
+            return jsonify({"error": str(e)}), 500
+        resp = jsonify(blocks[:limit])
+        if len(blocks) > limit:
+            resp.headers["X-Next-Cursor"] = str(blocks[limit]["index"])
+    resp.headers["ETag"] = etag
+    resp.headers["X-Chain-Height"] = str(tip.index)
+    return resp
 
-@app.route("/api/admin/verify_chain", methods=["GET"])
+@api.route("/api/admin/chain/ref/<ref_id>", methods=["GET"])
+def chain_ref(ref_id):
+    try:
+        uuid.UUID(ref_id)
+    except ValueError:
+        return jsonify({"error": f"Invalid id: {ref_id}"}), 400
+    try:
+        height = blockchain.find(ref_id)
+        block = blockchain.store.get(height) if height is not None else None
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    if block is None:
+        return jsonify({"error": "Not recorded on the chain"}), 404
+    return jsonify({"ref_id": ref_id, "height": height, "block": block.to_dict()})
+
+@api.route("/api/admin/chain/proof/<ref_id>", methods=["GET"])
+def chain_proof(ref_id):
+    try:
+        uuid.UUID(ref_id)
+    except ValueError:
+        return jsonify({"error": f"Invalid id: {ref_id}"}), 400
+    try:
+        proof = blockchain.proof(ref_id)
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    if proof is None:
+        return jsonify({"error": "Not recorded on the chain yet"}), 404
+    proof["ref_id"] = ref_id
+    return jsonify(proof)
+
+@api.route("/api/admin/verify_chain", methods=["GET"])
 def verify_chain():
-    valid = blockchain.is_valid()
-    return jsonify({"valid": valid, "length": len(blockchain.chain), "message": "Blockchain integrity verified ✅" if valid else "⚠️ Blockchain tampered!"})
+    mode = request.args.get("mode", "incremental")
+    try:
+        if mode == "full":
+            workers = request.args.get("workers")
+            result = verifier.audit(workers=int(workers) if workers else None)
+        elif mode == "incremental":
+            result = verifier.verify_incremental()
+        else:
+            return jsonify({"error": f"Invalid mode: {mode}"}), 400
+    except ValueError:
+        return jsonify({"error": "Invalid workers"}), 400
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    valid = result["valid"]
+    result.update({"length": result["to_height"] + 1, "message": "Blockchain integrity verified ✅" if valid else "⚠️ Blockchain tampered!"})
+    return jsonify(result)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    # Development server; production runs `gunicorn -c gunicorn.conf.py "app:create_app()"`.
+    create_app().run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import Histogram
+
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch_size=16, max_wait=0.01):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_size = Histogram(buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.queue_latency = Histogram()
+        self.retried_batches = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("batcher is closed")
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def map(self, items, timeout=None):
+        futures = [self.submit(item) for item in items]
+        return [f.result(timeout) for f in futures]
+
+    def close(self, timeout=None):
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch):
+        started = time.monotonic()
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        for _, _, enqueued_at in batch:
+            self.queue_latency.observe(started - enqueued_at)
+        self.batch_size.observe(len(batch))
+        try:
+            results = self.fn([item for item, _, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # One bad input must not fail everyone batched with it: retry
+            # each item alone so only its own caller sees the error.
+            self.retried_batches += 1
+            for item, future, _ in batch:
+                try:
+                    future.set_result(self.fn([item])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_seconds": self.max_wait,
+            "pending": self._queue.qsize(),
+            "retried_batches": self.retried_batches,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_latency_seconds": self.queue_latency.snapshot(),
+        }
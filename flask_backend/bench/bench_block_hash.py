@@ -0,0 +1,77 @@
+# Compares the original JSON block hash (version 1) with the binary header
+# format (version 2) on an in-memory chain. Each figure is the best of
+# --repeat runs, so one noisy run does not decide the comparison.
+#
+#   python bench/bench_block_hash.py --blocks 20000 --repeat 5
+import argparse
+import gc
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blockchain import Block, MemoryStore  # noqa: E402
+from verify import verify_range  # noqa: E402
+
+
+def sample_payload(i):
+    return {
+        "type": "opinion",
+        "opinion_id": str(uuid.uuid4()),
+        "sentiment": "positive",
+        "rating": 5,
+        "content": f"Opinion number {i}: the new release is fast, stable and much easier to use than before. " * 3,
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+def run_once(version, payloads):
+    store = MemoryStore()
+    started = time.perf_counter()
+    for data in payloads:
+        prev = store.blocks[-1]
+        store.blocks.append(Block(prev.index + 1, datetime.now(), data, prev.hash, version=version))
+    append_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = verify_range(store, 0, None)
+    verify_s = time.perf_counter() - started
+    assert result["bad_height"] is None, result
+    return append_s, verify_s
+
+
+def run(version, payloads, repeat):
+    # As timeit does: a collection landing in one version's loop would skew it.
+    gc.collect()
+    gc.disable()
+    try:
+        timings = [run_once(version, payloads) for _ in range(repeat)]
+    finally:
+        gc.enable()
+    n = len(payloads)
+    return {
+        "version": version,
+        "blocks": n,
+        "appends_per_sec": round(n / min(t[0] for t in timings)),
+        "verify_per_sec": round(n / min(t[1] for t in timings)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    payloads = [sample_payload(i) for i in range(args.blocks)]
+    results = [run(1, payloads, args.repeat), run(2, payloads, args.repeat)]
+    for r in results:
+        print(f"v{r['version']}: {r['appends_per_sec']:>10,} appends/s  {r['verify_per_sec']:>10,} verify/s  ({r['blocks']} blocks)")
+    print(f"speedup: append x{results[1]['appends_per_sec'] / results[0]['appends_per_sec']:.2f}, "
+          f"verify x{results[1]['verify_per_sec'] / results[0]['verify_per_sec']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Compares the original sequential /api/feedback write path with the
+# single-statement insert at several concurrency levels. Runs against the
+# database configured by DB_* (the rows it writes are real).
+#
+#   python bench/bench_feedback.py --requests 2000 --concurrency 1 4 16 32
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_conn, get_pool  # noqa: E402
+from sentiment import get_engine  # noqa: E402
+from submissions import insert_feedback  # noqa: E402
+
+ENGINE = get_engine("textblob")
+
+
+def legacy_feedback(cur, submitted_by, content, sentiment, rating, engine):
+    # The statement sequence /api/feedback ran before it was collapsed.
+    cur.execute("SELECT 1 FROM users WHERE user_id = %s;", (submitted_by,))
+    if cur.fetchone() is None:
+        cur.execute("INSERT INTO users (user_id, name) VALUES (%s, %s);", (submitted_by, f"AutoUser-{submitted_by}"))
+    cur.execute("SELECT form_id FROM feedback_forms LIMIT 1;")
+    form_id = cur.fetchone()[0]
+    response_id = str(uuid.uuid4())
+    cur.execute(
+        "INSERT INTO feedback_responses (response_id, form_id, submitted_by, submitted_at) VALUES (%s, %s, %s, %s);",
+        (response_id, form_id, submitted_by, datetime.now()),
+    )
+    cur.execute("SELECT question_id FROM questions LIMIT 1;")
+    question_id = cur.fetchone()[0]
+    cur.execute(
+        "INSERT INTO response_answers (answer_id, response_id, question_id, answer_text) VALUES (%s, %s, %s, %s);",
+        (str(uuid.uuid4()), response_id, question_id, content),
+    )
+    cur.execute("SELECT engine_id FROM engines WHERE name = %s AND version = %s LIMIT 1;", (engine.name, engine.version))
+    engine_id = cur.fetchone()[0]
+    cur.execute(
+        "INSERT INTO analytics (analytics_id, result, sentiment, rating, engine_id, response_id, analyzed_at) VALUES (%s, %s, %s, %s, %s, %s, %s);",
+        (str(uuid.uuid4()), json.dumps({"type": "feedback", "sentiment": sentiment, "rating": rating}), sentiment, rating, engine_id, response_id, datetime.now()),
+    )
+    return response_id
+
+
+PATHS = {"legacy": legacy_feedback, "single": insert_feedback}
+
+
+def submit(path, user_id, i):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            path(cur, user_id, f"Benchmark feedback {i}: works well overall.", "positive", 4, ENGINE)
+
+
+def run(name, requests, concurrency):
+    path = PATHS[name]
+    # A fixed set of authors, so both the "new user" and "known user" branches are hit.
+    users = [str(uuid.uuid4()) for _ in range(max(concurrency, 16))]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda i: submit(path, users[i % len(users)], i), range(requests)))
+    elapsed = time.perf_counter() - started
+    return {"path": name, "concurrency": concurrency, "requests": requests, "per_sec": round(requests / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    args = parser.parse_args()
+    # Warm the pool and the lookup caches before timing anything.
+    submit(insert_feedback, str(uuid.uuid4()), -1)
+    for concurrency in args.concurrency:
+        legacy, single = run("legacy", args.requests, concurrency), run("single", args.requests, concurrency)
+        print(f"c={concurrency:<3} legacy {legacy['per_sec']:>7,}/s  single {single['per_sec']:>7,}/s  "
+              f"x{single['per_sec'] / legacy['per_sec']:.2f}")
+    print(json.dumps(get_pool().stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Compares the PyTorch pipeline with the ONNX Runtime backend: texts/sec and
+# p50/p99 latency per batch, on the same preprocessed inputs.
+#
+#   python bench/bench_inference.py --texts 512 --batch-size 1 16 --int8
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai  # noqa: E402
+import onnx_backend  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run(name, model, texts, batch_size):
+    model(texts[:batch_size], batch_size=batch_size, truncation=True, padding=True)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        t0 = time.perf_counter()
+        model(texts[i:i + batch_size], batch_size=batch_size, truncation=True, padding=True)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    return {
+        "backend": name,
+        "batch_size": batch_size,
+        "texts_per_sec": round(len(texts) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--int8", action="store_true", help="also run the quantized variants")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    texts = ai.preprocess_many([onnx_backend.PARITY_TEXTS[i % len(onnx_backend.PARITY_TEXTS)] for i in range(args.texts)])
+    source = ai.MODEL_DIR or ai.MODEL_NAME
+    backends = [("torch", ai.load_model(quantize=False)), ("onnx", onnx_backend.load(source, offline=ai.OFFLINE))]
+    if args.int8:
+        backends += [("torch-int8", ai.load_model(quantize=True)), ("onnx-int8", onnx_backend.load(source, quantize=True, offline=ai.OFFLINE))]
+
+    results = []
+    for batch_size in args.batch_size:
+        for name, model in backends:
+            r = run(name, model, texts, batch_size)
+            results.append(r)
+            print(f"{name:<11} batch={batch_size:<3} {r['texts_per_sec']:>9} texts/s  p50 {r['p50_ms']:>8} ms  p99 {r['p99_ms']:>8} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Measures import time, model load time and peak resident memory of ai.py
+# for each loading option. Every option runs in a fresh interpreter.
+#
+#   python bench/bench_startup.py
+#   python bench/bench_startup.py --model-dir ./models/roberta   # adds the offline options
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, time
+started = time.perf_counter()
+import ai
+imported = time.perf_counter()
+rss_import = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if {load}:
+    ai.warmup()
+loaded = time.perf_counter()
+print(json.dumps({{
+    "import_s": round(imported - started, 3),
+    "load_s": round(loaded - imported, 3),
+    "rss_after_import_mb": round(rss_import / 1024, 1),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}}))
+"""
+
+
+def measure(name, env, load=True):
+    child_env = dict(os.environ, **env)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(load=load)],
+        cwd=BACKEND_DIR, env=child_env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["option"] = name
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", help="local model directory (from `python ai.py download <dir>`)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    options = [
+        ("import only", {}, False),
+        ("fp32", {"SENTIMENT_QUANTIZE": "0"}, True),
+        ("int8", {"SENTIMENT_QUANTIZE": "1"}, True),
+    ]
+    if args.model_dir:
+        options += [
+            ("fp32 offline", {"SENTIMENT_MODEL_DIR": args.model_dir, "SENTIMENT_QUANTIZE": "0"}, True),
+            ("int8 offline", {"SENTIMENT_MODEL_DIR": args.model_dir, "SENTIMENT_QUANTIZE": "1"}, True),
+        ]
+    results = [measure(*option) for option in options]
+    print(f"{'option':<14} {'import s':>9} {'load s':>8} {'rss import MB':>14} {'peak rss MB':>12}")
+    for r in results:
+        print(f"{r['option']:<14} {r['import_s']:>9} {r['load_s']:>8} {r['rss_after_import_mb']:>14} {r['peak_rss_mb']:>12}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
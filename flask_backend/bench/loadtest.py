@@ -0,0 +1,382 @@
+# Load-testing harness for the Flask API.
+#
+#   python bench/loadtest.py init                      # DESTRUCTIVE: loads database/db.sql into DB_*
+#   python bench/loadtest.py seed --opinions 1000000   # 10^4 .. 10^7, generated server-side
+#   python bench/loadtest.py run --url http://localhost:5000 --duration 60 --concurrency 32
+#   python bench/loadtest.py compare results/a.json results/b.json
+#
+# `run` drives a weighted mix of read and write requests against a running
+# app.py and records req/s, latency percentiles and the X-DB-Round-Trips
+# header per route (start the server with DB_ROUND_TRIP_HEADER=1). Results go
+# to bench/results/ as JSON, tagged with the current commit, so runs can be
+# compared across commits.
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_MIX = "opinions_list=40,opinions_post=20,feedback_post=10,targets_list=10,admin_opinions=10,admin_feedbacks=5,admin_overview=5"
+SEED_CHUNK = 250000
+CONTENTS = [
+    "Great service, the staff were friendly and quick.",
+    "The app keeps crashing when I upload photos.",
+    "It's fine, does what it says.",
+    "Terrible support, waited an hour for nothing.",
+    "Love the new design, much easier to navigate!",
+    "Prices went up again and quality went down.",
+    "Decent overall but the checkout is slow.",
+    "Absolutely fantastic experience from start to finish.",
+]
+
+SEED_OPINIONS_SQL = """
+    WITH u AS (SELECT array_agg(user_id ORDER BY name) AS ids FROM users WHERE name LIKE 'LoadUser-%%'),
+         t AS (SELECT array_agg(target_id ORDER BY name) AS ids FROM opinion_targets WHERE name LIKE 'LoadTarget-%%'),
+         o AS (
+            INSERT INTO opinions (opinion_id, submitted_by, target_id, content, submitted_at)
+            SELECT gen_random_uuid(), u.ids[1 + g %% cardinality(u.ids)], t.ids[1 + g %% cardinality(t.ids)],
+                   (%(contents)s::text[])[1 + g %% cardinality(%(contents)s::text[])], NOW() - g * INTERVAL '1 second'
+            FROM generate_series(%(start)s, %(stop)s) g, u, t
+            RETURNING opinion_id, submitted_at
+         ),
+         s AS (SELECT opinion_id, submitted_at, 1 + abs(hashtext(opinion_id::text)) %% 3 AS k FROM o)
+    INSERT INTO analytics (analytics_id, result, sentiment, rating, engine_id, opinion_id, analyzed_at)
+    SELECT gen_random_uuid(),
+           jsonb_build_object('sentiment', (ARRAY['positive','neutral','negative'])[k], 'rating', (ARRAY[5,3,1])[k]),
+           (ARRAY['positive','neutral','negative'])[k], (ARRAY[5,3,1])[k], %(engine_id)s, opinion_id, submitted_at
+    FROM s;
+"""
+
+SEED_FEEDBACK_SQL = """
+    WITH u AS (SELECT array_agg(user_id ORDER BY name) AS ids FROM users WHERE name LIKE 'LoadUser-%%'),
+         r AS (
+            INSERT INTO feedback_responses (response_id, form_id, submitted_by, submitted_at)
+            SELECT gen_random_uuid(), %(form_id)s, u.ids[1 + g %% cardinality(u.ids)], NOW() - g * INTERVAL '1 second'
+            FROM generate_series(%(start)s, %(stop)s) g, u
+            RETURNING response_id, submitted_at
+         ),
+         a AS (
+            INSERT INTO response_answers (answer_id, response_id, question_id, answer_text)
+            SELECT gen_random_uuid(), response_id, %(question_id)s,
+                   (%(contents)s::text[])[1 + abs(hashtext(response_id::text)) %% cardinality(%(contents)s::text[])]
+            FROM r
+         ),
+         s AS (SELECT response_id, submitted_at, 1 + abs(hashtext(response_id::text)) %% 3 AS k FROM r)
+    INSERT INTO analytics (analytics_id, result, sentiment, rating, engine_id, response_id, analyzed_at)
+    SELECT gen_random_uuid(),
+           jsonb_build_object('type', 'feedback', 'sentiment', (ARRAY['positive','neutral','negative'])[k], 'rating', (ARRAY[5,3,1])[k]),
+           (ARRAY['positive','neutral','negative'])[k], (ARRAY[5,3,1])[k], %(engine_id)s, response_id, submitted_at
+    FROM s;
+"""
+
+
+# ==========================================
+# Database setup
+# ==========================================
+def init_db(sql_path):
+    from db import get_conn
+
+    with open(sql_path) as f:
+        sql = f.read()
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+    print(f"🗄️ Loaded {sql_path}")
+
+
+def seed(opinions, feedback, users, targets):
+    from db import dedicated_connection, get_conn
+    from lookups import engine_id, feedback_defaults
+    from schema import ensure_schema
+    from sentiment import get_engine
+
+    ensure_schema()
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO users (user_id, name) SELECT gen_random_uuid(), 'LoadUser-' || lpad(g::text, 7, '0') "
+                "FROM generate_series(1, %s) g ON CONFLICT DO NOTHING;",
+                (users,),
+            )
+            cur.execute("SELECT count(*) FROM opinion_targets WHERE name LIKE 'LoadTarget-%';")
+            have = cur.fetchone()[0]
+            cur.execute(
+                "INSERT INTO opinion_targets (name, category) "
+                "SELECT 'LoadTarget-' || lpad(g::text, 5, '0'), (ARRAY['Product','Service','Place','Other'])[1 + g %% 4] "
+                "FROM generate_series(%s, %s) g;",
+                (have + 1, targets),
+            )
+            cur.execute("SELECT user_id FROM users WHERE name LIKE 'LoadUser-%' ORDER BY name LIMIT 1;")
+            form_id, question_id = feedback_defaults(cur, cur.fetchone()[0])
+            engine = engine_id(cur, get_engine("textblob"))
+
+    started = time.perf_counter()
+    # Chunked so no single transaction holds millions of rows of WAL and trigger state.
+    for sql, total, extra in ((SEED_OPINIONS_SQL, opinions, {}), (SEED_FEEDBACK_SQL, feedback, {"form_id": form_id, "question_id": question_id})):
+        for start in range(1, total + 1, SEED_CHUNK):
+            stop = min(total, start + SEED_CHUNK - 1)
+            with get_conn() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, dict(extra, start=start, stop=stop, contents=CONTENTS, engine_id=engine))
+            print(f"🌱 {stop:,}/{total:,} rows ({time.perf_counter() - started:.1f}s)")
+    conn = dedicated_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE opinions, analytics, feedback_responses, response_answers;")
+    finally:
+        conn.close()
+
+
+# ==========================================
+# Workload
+# ==========================================
+class Client:
+    # One keep-alive connection per worker thread.
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body, headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                return resp.status, resp.getheader("X-DB-Round-Trips"), data
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+class Workload:
+    def __init__(self, client, target_ids, user_ids):
+        self.client = client
+        self.target_ids = target_ids
+        self.user_ids = user_ids
+
+    def opinions_list(self):
+        params = "limit=50"
+        if random.random() < 0.5:
+            params += f"&target_id={random.choice(self.target_ids)}"
+        return self.client.request("GET", f"/api/opinions?{params}")
+
+    def opinions_post(self):
+        return self.client.request("POST", "/api/opinions", {
+            "target_id": random.choice(self.target_ids),
+            "submitted_by": random.choice(self.user_ids),
+            "content": random.choice(CONTENTS),
+        })
+
+    def feedback_post(self):
+        return self.client.request("POST", "/api/feedback", {
+            "submitted_by": random.choice(self.user_ids),
+            "content": random.choice(CONTENTS),
+        })
+
+    def targets_list(self):
+        return self.client.request("GET", "/api/targets")
+
+    def admin_opinions(self):
+        return self.client.request("GET", "/api/admin/opinions?limit=100", headers={"X-Username": "admin"})
+
+    def admin_feedbacks(self):
+        return self.client.request("GET", "/api/admin/feedbacks?limit=100", headers={"X-Username": "admin"})
+
+    def admin_overview(self):
+        return self.client.request("GET", "/api/admin/overview", headers={"X-Username": "admin"})
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(Workload, name.strip()):
+            raise SystemExit(f"Unknown operation in mix: {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run(url, duration, concurrency, mix, warmup, users):
+    weights = parse_mix(mix)
+    names = list(weights)
+
+    status, _, body = Client(url).request("GET", "/api/targets")
+    if status != 200:
+        raise SystemExit(f"GET /api/targets returned {status}")
+    target_ids = [t["target_id"] for t in json.loads(body)]
+    if not target_ids:
+        raise SystemExit("No targets; run `seed` first")
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + warmup + duration
+    record_after = time.monotonic() + warmup
+
+    def worker():
+        workload = Workload(Client(url), target_ids, user_ids)
+        local = {name: [] for name in names}
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            name = random.choices(names, weights=[weights[n] for n in names])[0]
+            t0 = time.perf_counter()
+            try:
+                status, trips, _ = getattr(workload, name)()
+            except (http.client.HTTPException, OSError):
+                status, trips = 0, None
+            elapsed = time.perf_counter() - t0
+            if now >= record_after:
+                local[name].append((elapsed, status, int(trips) if trips is not None else None))
+        with lock:
+            for name, rows in local.items():
+                samples[name].extend(rows)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    routes = {}
+    for name, rows in samples.items():
+        latencies = [r[0] for r in rows]
+        trips = [r[2] for r in rows if r[2] is not None]
+        routes[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if not 200 <= r[1] < 300),
+            "req_per_sec": round(len(rows) / duration, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2) if rows else None,
+            "p90_ms": round(percentile(latencies, 90) * 1000, 2) if rows else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2) if rows else None,
+            "max_ms": round(max(latencies) * 1000, 2) if rows else None,
+            "db_round_trips": round(sum(trips) / len(trips), 2) if trips else None,
+        }
+    all_latencies = [r[0] for rows in samples.values() for r in rows]
+    count = len(all_latencies)
+    return {
+        "requests": count,
+        "errors": sum(r["errors"] for r in routes.values()),
+        "req_per_sec": round(count / duration, 2),
+        "p50_ms": round(percentile(all_latencies, 50) * 1000, 2) if count else None,
+        "p99_ms": round(percentile(all_latencies, 99) * 1000, 2) if count else None,
+        "routes": routes,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def data_volume(url):
+    status, _, body = Client(url).request("GET", "/api/admin/overview", headers={"X-Username": "admin"})
+    return json.loads(body) if status == 200 else None
+
+
+def print_report(result):
+    print(f"{'route':<16} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>7} {'db trips':>9}")
+    for name, r in result["routes"].items():
+        print(f"{name:<16} {r['req_per_sec']:>9} {r['p50_ms']!s:>9} {r['p90_ms']!s:>9} {r['p99_ms']!s:>9} {r['errors']:>7} {r['db_round_trips']!s:>9}")
+    print(f"{'total':<16} {result['req_per_sec']:>9} {result['p50_ms']!s:>9} {'':>9} {result['p99_ms']!s:>9} {result['errors']:>7}")
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['revision']} -> {new['revision']}")
+    print(f"{'route':<16} {'req/s':>20} {'p99 ms':>22} {'db trips':>14}")
+    for name, n in new["result"]["routes"].items():
+        o = old["result"]["routes"].get(name)
+        if not o:
+            continue
+        change = f"x{n['req_per_sec'] / o['req_per_sec']:.2f}" if o["req_per_sec"] else "-"
+        print(f"{name:<16} {o['req_per_sec']:>8} -> {n['req_per_sec']:<8} {change:<6} {o['p99_ms']!s:>8} -> {n['p99_ms']!s:<8} "
+              f"{o['db_round_trips']!s:>5} -> {n['db_round_trips']!s:<5}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init", help="load database/db.sql (drops the public schema)")
+    p.add_argument("--sql", default=os.path.join(os.path.dirname(BACKEND_DIR), "database", "db.sql"))
+
+    p = sub.add_parser("seed")
+    p.add_argument("--opinions", type=int, default=10 ** 4)
+    p.add_argument("--feedback", type=int, help="defaults to a tenth of --opinions")
+    p.add_argument("--users", type=int, default=10000)
+    p.add_argument("--targets", type=int, default=200)
+
+    p = sub.add_parser("run")
+    p.add_argument("--url", default="http://localhost:5000")
+    p.add_argument("--duration", type=float, default=30)
+    p.add_argument("--warmup", type=float, default=5)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--mix", default=DEFAULT_MIX)
+    p.add_argument("--users", type=int, default=1000, help="distinct authors used by write requests")
+    p.add_argument("--out", help="defaults to bench/results/loadtest-<revision>-<time>.json")
+
+    p = sub.add_parser("compare")
+    p.add_argument("old")
+    p.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "init":
+        init_db(args.sql)
+    elif args.command == "seed":
+        seed(args.opinions, args.feedback if args.feedback is not None else args.opinions // 10, args.users, args.targets)
+    elif args.command == "compare":
+        compare(args.old, args.new)
+    else:
+        result = run(args.url, args.duration, args.concurrency, args.mix, args.warmup, args.users)
+        print_report(result)
+        revision = git_revision()
+        report = {
+            "revision": revision,
+            "started_at": datetime.now().isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("command", "out")},
+            "data": data_volume(args.url),
+            "result": result,
+        }
+        out = args.out or os.path.join(BENCH_DIR, "results", f"loadtest-{revision}-{datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import json
+import os
+import uuid
+from datetime import datetime
+
+from db import copy_rows
+from lookups import engine_id, feedback_defaults
+
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+BULK_SCORE_CHUNK = int(os.getenv("BULK_SCORE_CHUNK", "512"))
+BULK_SCORE_TIMEOUT = float(os.getenv("BULK_SCORE_TIMEOUT", "60"))
+
+
+class BulkError(ValueError):
+    pass
+
+
+def parse_rows(req):
+    # NDJSON bodies are parsed line by line so one bad line only fails that row.
+    rows, errors = [], {}
+    if "ndjson" in (req.content_type or "") or "jsonl" in (req.content_type or ""):
+        for line in req.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                errors[len(rows)] = f"Invalid JSON: {e}"
+                rows.append(None)
+    else:
+        data = req.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get("items")
+        if not isinstance(data, list):
+            raise BulkError("Expected a JSON array or NDJSON body")
+        rows = data
+    if len(rows) > BULK_MAX_ROWS:
+        raise BulkError(f"Too many rows: {len(rows)} > {BULK_MAX_ROWS}")
+    return rows, errors
+
+
+def _uuid_or_none(value):
+    if value in (None, ""):
+        return None
+    return str(uuid.UUID(str(value)))
+
+
+def ensure_users(cur, user_ids):
+    if not user_ids:
+        return
+    cur.execute(
+        "INSERT INTO users (user_id, name) SELECT u, 'AutoUser-' || u FROM unnest(%s::uuid[]) AS u ON CONFLICT DO NOTHING;",
+        (sorted(user_ids),),
+    )
+
+
+def score_texts(scorer, texts):
+    results, engines = [], []
+    for i in range(0, len(texts), BULK_SCORE_CHUNK):
+        chunk, engine = scorer.score_many(texts[i:i + BULK_SCORE_CHUNK], timeout=BULK_SCORE_TIMEOUT)
+        results.extend(chunk)
+        engines.extend([engine] * len(chunk))
+    return results, engines
+
+
+def prepare_opinions(rows, errors, scorer, async_mode=False):
+    # Validation and model inference happen before any connection is taken,
+    # so the write transaction below only holds locks for lookups and COPYs.
+    # Rows with an unknown target are scored too; they are rare and rejected later.
+    valid = []
+    for i, row in enumerate(rows):
+        if i in errors:
+            continue
+        if not isinstance(row, dict) or not row.get("target_id") or not row.get("content"):
+            errors[i] = "Missing target_id or content"
+            continue
+        try:
+            target_id = _uuid_or_none(row["target_id"])
+            submitted_by = _uuid_or_none(row.get("submitted_by"))
+        except ValueError:
+            errors[i] = "Invalid UUID"
+            continue
+        valid.append((i, submitted_by, target_id, str(row["content"])))
+    if async_mode:
+        return [v + (None, None) for v in valid]
+    scores, engines = score_texts(scorer, [v[3] for v in valid])
+    return [v + (s, e) for v, s, e in zip(valid, scores, engines)]
+
+
+def ingest_opinions(cur, prepared, errors, async_mode=False):
+    cur.execute(
+        "SELECT target_id::text FROM opinion_targets WHERE target_id = ANY(%s::uuid[]);",
+        (list({v[2] for v in prepared}),),
+    )
+    known_targets = {r[0] for r in cur.fetchall()}
+    accepted = []
+    for v in prepared:
+        if v[2] in known_targets:
+            accepted.append(v)
+        else:
+            errors[v[0]] = f"Invalid target_id: {v[2]}"
+    ensure_users(cur, {v[1] for v in accepted if v[1]})
+
+    now = datetime.now()
+    opinion_ids = [str(uuid.uuid4()) for _ in accepted]
+    copy_rows(
+        cur,
+        "opinions",
+        ("opinion_id", "submitted_by", "target_id", "content", "submitted_at"),
+        [(oid, v[1], v[2], v[3], now) for oid, v in zip(opinion_ids, accepted)],
+    )
+    results = {}
+    if async_mode:
+        copy_rows(cur, "scoring_jobs", ("opinion_id",), [(oid,) for oid in opinion_ids])
+        for oid, v in zip(opinion_ids, accepted):
+            results[v[0]] = {"index": v[0], "opinion_id": oid, "status": "pending"}
+    else:
+        engine_ids = {e.name: engine_id(cur, e) for e in {v[5] for v in accepted}}
+        copy_rows(
+            cur,
+            "analytics",
+            ("analytics_id", "result", "sentiment", "rating", "engine_id", "opinion_id", "analyzed_at"),
+            [
+                (str(uuid.uuid4()), json.dumps({"sentiment": v[4]["sentiment"], "rating": v[4]["rating"]}), v[4]["sentiment"], v[4]["rating"], engine_ids[v[5].name], oid, now)
+                for oid, v in zip(opinion_ids, accepted)
+            ],
+        )
+        for oid, v in zip(opinion_ids, accepted):
+            results[v[0]] = {"index": v[0], "opinion_id": oid, "sentiment": v[4]["sentiment"], "rating": v[4]["rating"]}
+    for i, message in errors.items():
+        results[i] = {"index": i, "error": message}
+    return [results[i] for i in sorted(results)], now
+
+
+def prepare_feedback(rows, errors, scorer):
+    # As prepare_opinions: scored before the write transaction opens.
+    accepted = []
+    for i, row in enumerate(rows):
+        if i in errors:
+            continue
+        if not isinstance(row, dict) or not row.get("submitted_by") or not row.get("content"):
+            errors[i] = "Missing submitted_by or content"
+            continue
+        try:
+            submitted_by = _uuid_or_none(row["submitted_by"])
+        except ValueError:
+            errors[i] = "Invalid UUID"
+            continue
+        accepted.append((i, submitted_by, str(row["content"])))
+    scores, engines = score_texts(scorer, [v[2] for v in accepted])
+    return [v + (s, e) for v, s, e in zip(accepted, scores, engines)]
+
+
+def ingest_feedback(cur, prepared, errors):
+    results = {}
+    now = datetime.now()
+    if prepared:
+        ensure_users(cur, {v[1] for v in prepared})
+        form_id, question_id = feedback_defaults(cur, prepared[0][1])
+        response_ids = [str(uuid.uuid4()) for _ in prepared]
+        engine_ids = {e.name: engine_id(cur, e) for e in {v[4] for v in prepared}}
+        copy_rows(
+            cur,
+            "feedback_responses",
+            ("response_id", "form_id", "submitted_by", "submitted_at"),
+            [(rid, form_id, v[1], now) for rid, v in zip(response_ids, prepared)],
+        )
+        copy_rows(
+            cur,
+            "response_answers",
+            ("answer_id", "response_id", "question_id", "answer_text"),
+            [(str(uuid.uuid4()), rid, question_id, v[2]) for rid, v in zip(response_ids, prepared)],
+        )
+        copy_rows(
+            cur,
+            "analytics",
+            ("analytics_id", "result", "sentiment", "rating", "engine_id", "response_id", "analyzed_at"),
+            [
+                (str(uuid.uuid4()), json.dumps({"type": "feedback", "sentiment": v[3]["sentiment"], "rating": v[3]["rating"]}), v[3]["sentiment"], v[3]["rating"], engine_ids[v[4].name], rid, now)
+                for rid, v in zip(response_ids, prepared)
+            ],
+        )
+        for rid, v in zip(response_ids, prepared):
+            results[v[0]] = {"index": v[0], "response_id": rid, "sentiment": v[3]["sentiment"], "rating": v[3]["rating"]}
+    for i, message in errors.items():
+        results[i] = {"index": i, "error": message}
+    return [results[i] for i in sorted(results)], now
@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import registry
+
+INVALIDATION_CHANNEL = "cache_invalidate"
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+caches = {}
+
+
+def get_cache(name, maxsize=1024, ttl=None):
+    if name not in caches:
+        caches[name] = TTLCache(maxsize, ttl)
+    return caches[name]
+
+
+def invalidate(name, key=None):
+    if name in caches:
+        caches[name].invalidate(key)
+
+
+def notify_invalidation(cur, name, key=None):
+    # Sent inside the writer's transaction, so other processes only drop the
+    # entry once the change is committed. The local copy is dropped right away.
+    invalidate(name, key)
+    cur.execute("SELECT pg_notify(%s, %s);", (INVALIDATION_CHANNEL, json.dumps({"cache": name, "key": key})))
+
+
+def _on_invalidation(payload):
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        return
+    invalidate(message.get("cache"), message.get("key"))
+
+
+def _invalidate_all():
+    for c in caches.values():
+        c.invalidate()
+
+
+def start_invalidation_listener():
+    # Imported here so process-local caches (e.g. in ai.py) don't pull in the database layer.
+    from db import listener
+    listener.subscribe(INVALIDATION_CHANNEL, _on_invalidation, on_reconnect=_invalidate_all)
+
+
+def cache_stats():
+    return {name: c.stats() for name, c in caches.items()}
+
+
+def _lookup_counts():
+    out = {}
+    for name, c in list(caches.items()):
+        out[(name, "hit")] = c.hits
+        out[(name, "miss")] = c.misses
+    return out
+
+
+registry.gauge("cache_lookups", "Cumulative in-process cache lookups by result.", _lookup_counts, ("cache", "result"))
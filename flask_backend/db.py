@@ -0,0 +1,418 @@
+import csv
+import functools
+import io
+import os
+import re
+import select
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+from metrics import Histogram, registry
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class _RoundTrips(threading.local):
+    count = 0
+
+
+# Statements sent to the server by the current thread; app.py resets it per request.
+round_trips = _RoundTrips()
+
+query_seconds = registry.histogram("db_query_duration_seconds", "Time spent executing SQL statements.", ("statement",))
+_SELECT_FROM = re.compile(r"^\s*SELECT\b.*?\bFROM\s+([\w.]+)", re.I | re.S)
+_VERB_TARGET = re.compile(r"^\s*(INSERT\s+INTO|DELETE\s+FROM|\w+)\s*([\w.]+)?", re.I)
+_WRITES = re.compile(r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+([\w.]+)", re.I)
+
+
+@functools.lru_cache(maxsize=512)
+def _statement_label(head):
+    # The verb and the table(s) it touches, e.g. "SELECT opinions" or
+    # "WITH users,opinions,analytics", so the label set stays small however
+    # many distinct query strings run.
+    m = _SELECT_FROM.match(head)
+    if m:
+        return f"SELECT {m.group(1).lower()}"
+    m = _VERB_TARGET.match(head)
+    if not m:
+        return "other"
+    verb = " ".join(m.group(1).upper().split())
+    if verb == "WITH":
+        return "WITH " + ",".join(dict.fromkeys(t.lower() for t in _WRITES.findall(head)))
+    return f"{verb} {m.group(2).lower()}" if m.group(2) else verb
+
+
+def statement_label(query):
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    return _statement_label(query[:2000])
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    # Counts and times every statement. Named cursors also fetch in itersize
+    # chunks; only the statement itself is counted and timed.
+    def _timed(self, query, fn, *args):
+        round_trips.count += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            query_seconds.labels(statement_label(query)).observe(time.perf_counter() - started)
+
+    def execute(self, query, vars=None):
+        return self._timed(query, super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(query, super().executemany, query, vars_list)
+
+    def callproc(self, procname, parameters=None):
+        return self._timed(f"CALL {procname}", super().callproc, procname, parameters)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(sql, super().copy_expert, sql, file, size)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = InstrumentedCursor
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.overflow = False
+
+
+class ConnectionPool:
+    def __init__(self, minconn=1, maxconn=10, max_overflow=0, timeout=30.0, recycle=1800.0, ping_after=30.0, **connect_kwargs):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError("invalid pool size")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.connect_kwargs = connect_kwargs
+        self.wait_time = Histogram()
+        self._cond = threading.Condition()
+        self._reset()
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._overflow = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._failed_checks = 0
+
+    def _connect(self):
+        return psycopg2.connect(connection_factory=PooledConnection, **self.connect_kwargs)
+
+    def _healthy(self, conn):
+        # Called without the lock held: the ping is a network round trip (or a
+        # TCP timeout if the server is gone) that other threads must not wait on.
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self.recycle and now - conn.created_at > self.recycle:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if now - conn.last_used >= self.ping_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+                conn.rollback()
+            except psycopg2.Error:
+                with self._cond:
+                    self._failed_checks += 1
+                return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                if self._pid != os.getpid():
+                    # Connections inherited across fork share the parent's sockets.
+                    self._reset()
+                while True:
+                    if self._idle:
+                        # Still counted in _size while it is checked outside the lock.
+                        conn = self._idle.pop()
+                        pid = self._pid
+                        break
+                    if self._size < self.maxconn + self.max_overflow:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection")
+                    self._cond.wait(remaining)
+            if conn is None:
+                break
+            if self._healthy(conn):
+                with self._cond:
+                    return self._checked_out(conn, started)
+            self._discard(conn)
+            with self._cond:
+                if self._pid == pid:
+                    self._size -= 1
+                    self._cond.notify()
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            conn.overflow = self._size > self.maxconn
+            if conn.overflow:
+                self._overflow += 1
+            return self._checked_out(conn, started)
+
+    def _checked_out(self, conn, started):
+        self._in_use += 1
+        self._checkouts += 1
+        self._peak_in_use = max(self._peak_in_use, self._in_use)
+        self.wait_time.observe(time.monotonic() - started)
+        return conn
+
+    def putconn(self, conn):
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            if conn.overflow:
+                self._overflow -= 1
+            keep = not (conn.closed or conn.overflow or self._size > self.maxconn)
+            if keep:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not keep:
+            self._discard(conn)
+
+    def closeall(self):
+        with self._cond:
+            for conn in self._idle:
+                self._discard(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "max_overflow": self.max_overflow,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "overflow": self._overflow,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "failed_checks": self._failed_checks,
+                "wait_seconds": self.wait_time.snapshot(),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    minconn=int(os.getenv("DB_POOL_MIN", "1")),
+                    maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+                    max_overflow=int(os.getenv("DB_POOL_OVERFLOW", "5")),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                    recycle=float(os.getenv("DB_POOL_RECYCLE", "1800")),
+                    ping_after=float(os.getenv("DB_POOL_PING_AFTER", "30")),
+                    dbname=os.getenv("DB_NAME", "nulltrace"),
+                    user=os.getenv("DB_USER", "postgres"),
+                    password=os.getenv("DB_PASSWORD", "postgres"),
+                    host=os.getenv("DB_HOST", "localhost"),
+                )
+                registry.register_histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection.", _pool.wait_time)
+    return _pool
+
+
+def _pool_gauge(*keys):
+    def read():
+        stats = _pool.stats() if _pool is not None else {}
+        return {(k,): stats[k] for k in keys if k in stats}
+    return read
+
+
+registry.gauge("db_pool_connections", "Pooled connections by state.", _pool_gauge("size", "idle", "in_use", "overflow"), ("state",))
+registry.gauge("db_pool_events", "Cumulative pool events.", _pool_gauge("checkouts", "timeouts", "recycled", "failed_checks"), ("event",))
+
+
+@contextmanager
+def get_conn():
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def copy_rows(cur, table, columns, rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def dedicated_connection():
+    # For long-lived sessions such as LISTEN that must not hold a pool slot.
+    conn = psycopg2.connect(**get_pool().connect_kwargs)
+    conn.autocommit = True
+    return conn
+
+
+class PgListener:
+    # One LISTEN connection per process; callbacks run on the listener thread.
+    # Only that thread touches the connection: it is blocked in select() on it,
+    # so subscribe() queues new channels and wakes it through a self-pipe.
+    def __init__(self, poll_timeout=5.0, retry_delay=1.0):
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self._callbacks = {}
+        self._reconnect_callbacks = []
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pipe = None
+
+    def subscribe(self, channel, callback, on_reconnect=None):
+        # on_reconnect runs on the listener thread once LISTEN on the channel
+        # is active, and again after every reconnect.
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+            if on_reconnect is not None:
+                self._reconnect_callbacks.append(on_reconnect)
+            self._pending.append((channel, on_reconnect))
+        self.start()
+        self._wake()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._pipe is None:
+                    # Created lazily so a pre-fork parent never shares it with its workers.
+                    self._pipe = os.pipe()
+                    os.set_blocking(self._pipe[1], False)
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _wake(self):
+        if self._pipe is None:
+            return
+        try:
+            os.write(self._pipe[1], b"\0")
+        except BlockingIOError:
+            # The pipe is full, so a wake-up is already pending.
+            pass
+
+    def _listen_pending(self, cur):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for channel, on_reconnect in pending:
+            cur.execute(f"LISTEN {channel};")
+            if on_reconnect is not None:
+                on_reconnect()
+
+    def _run(self):
+        wake = self._pipe[0]
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = dedicated_connection()
+                with self._lock:
+                    # Everything subscribed so far is covered by this (re)connect.
+                    channels = list(self._callbacks)
+                    reconnect_callbacks = list(self._reconnect_callbacks)
+                    self._pending = []
+                with conn.cursor() as cur:
+                    for channel in channels:
+                        cur.execute(f"LISTEN {channel};")
+                    # Notifications sent while we were disconnected are lost.
+                    for callback in reconnect_callbacks:
+                        callback()
+                    while not self._stop.is_set():
+                        readable, _, _ = select.select([conn, wake], [], [], self.poll_timeout)
+                        if wake in readable:
+                            os.read(wake, 4096)
+                            self._listen_pending(cur)
+                        if conn in readable:
+                            conn.poll()
+                        while conn.notifies:
+                            note = conn.notifies.pop(0)
+                            for callback in self._callbacks.get(note.channel, []):
+                                try:
+                                    callback(note.payload)
+                                except Exception:
+                                    traceback.print_exc()
+            except psycopg2.Error:
+                traceback.print_exc()
+                self._stop.wait(self.retry_delay)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+
+
+listener = PgListener()
@@ -32,7 +32,9 @@ CREATE TABLE engines (
 );
 
 INSERT INTO engines (engine_id, name, version)
-VALUES ('00000000-0000-0000-0000-000000000100', 'DefaultEngine', '1.0');
+VALUES ('00000000-0000-0000-0000-000000000100', 'DefaultEngine', '1.0'),
+       ('00000000-0000-0000-0000-000000000101', 'TextBlob', '1.0'),
+       ('00000000-0000-0000-0000-000000000102', 'RoBERTa', '1.0');
 
 -- ==================== OPINION TARGETS ====================
 CREATE TABLE opinion_targets (
@@ -93,6 +95,8 @@ VALUES ('00000000-0000-0000-0000-000000000301', '00000000-0000-0000-0000-0000000
 CREATE TABLE analytics (
     analytics_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     result JSONB NOT NULL,
+    sentiment TEXT,
+    rating SMALLINT,
     engine_id UUID NOT NULL REFERENCES engines(engine_id),
     opinion_id UUID REFERENCES opinions(opinion_id) ON DELETE CASCADE,
     form_id UUID REFERENCES feedback_forms(form_id) ON DELETE CASCADE,
@@ -100,13 +104,173 @@ CREATE TABLE analytics (
     analyzed_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
+-- ==================== SCORING QUEUE ====================
+-- Opinions accepted in async mode wait here until a worker writes their analytics row.
+CREATE TABLE scoring_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    opinion_id UUID NOT NULL UNIQUE REFERENCES opinions(opinion_id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    available_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- ==================== LEDGER ====================
+-- Append-only blockchain shared by every backend process.
+CREATE TABLE ledger_blocks (
+    height BIGINT PRIMARY KEY,
+    timestamp TIMESTAMP NOT NULL,
+    data JSONB NOT NULL,
+    prev_hash TEXT NOT NULL,
+    hash TEXT NOT NULL UNIQUE,
+    version SMALLINT NOT NULL DEFAULT 1
+);
+
+-- Maps an opinion_id / feedback_id to the block that recorded it. For
+-- Merkle-batched blocks it also keeps the item, its leaf hash and position.
+CREATE TABLE ledger_refs (
+    ref_id UUID PRIMARY KEY,
+    ref_type TEXT NOT NULL,
+    height BIGINT NOT NULL REFERENCES ledger_blocks(height),
+    position INT NOT NULL DEFAULT 0,
+    leaf TEXT,
+    data JSONB
+);
+
+-- Last verified height and hash, so verification only rehashes new blocks.
+CREATE TABLE ledger_checkpoints (
+    height BIGINT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    verified_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- ==================== STATISTICS ====================
+-- Counters are sharded 16 ways per name so concurrent writers rarely touch
+-- the same row; readers sum the shards. Feedback rollups use the zero target id.
+CREATE TABLE stats_counters (
+    name TEXT NOT NULL,
+    shard SMALLINT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+CREATE TABLE sentiment_rollups (
+    target_id UUID NOT NULL,
+    bucket_size TEXT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    sentiment TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (target_id, bucket_size, bucket, sentiment)
+);
+
+CREATE OR REPLACE FUNCTION stats_count_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO stats_counters (name, shard, value)
+    SELECT TG_ARGV[0], floor(random() * 16)::smallint, COUNT(*) FROM new_rows
+    ON CONFLICT (name, shard) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stats_count_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO stats_counters (name, shard, value)
+    SELECT TG_ARGV[0], floor(random() * 16)::smallint, -COUNT(*) FROM old_rows
+    ON CONFLICT (name, shard) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stats_rollup_analytics() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sentiment_rollups (target_id, bucket_size, bucket, sentiment, count, rating_sum)
+    SELECT COALESCE(o.target_id, '00000000-0000-0000-0000-000000000000'::uuid),
+           b.size,
+           date_trunc(b.size, COALESCE(o.submitted_at, fr.submitted_at, n.analyzed_at)),
+           COALESCE(n.sentiment, n.result->>'sentiment'),
+           COUNT(*),
+           COALESCE(SUM(COALESCE(n.rating, CASE WHEN n.result->>'rating' ~ '^-?[0-9]{1,9}$' THEN (n.result->>'rating')::int END)), 0)
+    FROM new_rows n
+    LEFT JOIN opinions o ON o.opinion_id = n.opinion_id
+    LEFT JOIN feedback_responses fr ON fr.response_id = n.response_id
+    CROSS JOIN (VALUES ('hour'), ('day')) AS b(size)
+    WHERE n.sentiment IS NOT NULL OR jsonb_typeof(n.result->'sentiment') = 'string'
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (target_id, bucket_size, bucket, sentiment) DO UPDATE
+    SET count = sentiment_rollups.count + EXCLUDED.count,
+        rating_sum = sentiment_rollups.rating_sum + EXCLUDED.rating_sum;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Live stream (events.py): ids of inserted rows, 150 per payload since NOTIFY
+-- payloads are capped at 8000 bytes. Delivered on commit only.
+CREATE OR REPLACE FUNCTION stream_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_ARGV[0] = 'opinion' THEN
+        PERFORM pg_notify('stream_events', json_build_object('kind', 'opinion', 'ids', json_agg(opinion_id))::text)
+        FROM (SELECT opinion_id, (row_number() OVER () - 1) / 150 AS chunk FROM new_rows) c
+        GROUP BY chunk;
+    ELSE
+        PERFORM pg_notify('stream_events', json_build_object('kind', 'analytics', 'ids', json_agg(analytics_id))::text)
+        FROM (SELECT analytics_id, (row_number() OVER () - 1) / 150 AS chunk FROM new_rows) c
+        GROUP BY chunk;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_count_insert AFTER INSERT ON users REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('users');
+CREATE TRIGGER users_count_delete AFTER DELETE ON users REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('users');
+CREATE TRIGGER opinions_count_insert AFTER INSERT ON opinions REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('opinions');
+CREATE TRIGGER opinions_count_delete AFTER DELETE ON opinions REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('opinions');
+CREATE TRIGGER feedback_responses_count_insert AFTER INSERT ON feedback_responses REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('feedbacks');
+CREATE TRIGGER feedback_responses_count_delete AFTER DELETE ON feedback_responses REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('feedbacks');
+CREATE TRIGGER opinion_targets_count_insert AFTER INSERT ON opinion_targets REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('targets');
+CREATE TRIGGER opinion_targets_count_delete AFTER DELETE ON opinion_targets REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('targets');
+CREATE TRIGGER analytics_rollup AFTER INSERT ON analytics REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_rollup_analytics();
+CREATE TRIGGER opinions_stream AFTER INSERT ON opinions REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stream_notify('opinion');
+CREATE TRIGGER analytics_stream AFTER INSERT ON analytics REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stream_notify('analytics');
+
+-- Seed the counters with rows inserted above, before the triggers existed.
+INSERT INTO stats_counters (name, shard, value)
+SELECT 'users', 0, COUNT(*) FROM users
+UNION ALL SELECT 'opinions', 0, COUNT(*) FROM opinions
+UNION ALL SELECT 'feedbacks', 0, COUNT(*) FROM feedback_responses
+UNION ALL SELECT 'targets', 0, COUNT(*) FROM opinion_targets;
+
+INSERT INTO sentiment_rollups (target_id, bucket_size, bucket, sentiment, count, rating_sum)
+SELECT COALESCE(o.target_id, '00000000-0000-0000-0000-000000000000'::uuid),
+       b.size,
+       date_trunc(b.size, COALESCE(o.submitted_at, fr.submitted_at, a.analyzed_at)),
+       a.result->>'sentiment',
+       COUNT(*),
+       COALESCE(SUM(CASE WHEN a.result->>'rating' ~ '^-?[0-9]{1,9}$' THEN (a.result->>'rating')::int END), 0)
+FROM analytics a
+LEFT JOIN opinions o ON o.opinion_id = a.opinion_id
+LEFT JOIN feedback_responses fr ON fr.response_id = a.response_id
+CROSS JOIN (VALUES ('hour'), ('day')) AS b(size)
+WHERE jsonb_typeof(a.result->'sentiment') = 'string'
+GROUP BY 1, 2, 3, 4;
+
 -- Indexes for performance
 CREATE INDEX idx_questions_form ON questions(form_id);
 CREATE INDEX idx_responses_form ON feedback_responses(form_id);
 CREATE INDEX idx_answers_response ON response_answers(response_id);
 CREATE INDEX idx_answers_question ON response_answers(question_id);
-CREATE INDEX idx_analytics_opinion ON analytics(opinion_id);
-CREATE INDEX idx_analytics_response ON analytics(response_id);
+CREATE INDEX idx_analytics_opinion_typed ON analytics(opinion_id) INCLUDE (sentiment, rating);
+CREATE INDEX idx_analytics_response_typed ON analytics(response_id) INCLUDE (sentiment, rating);
+CREATE INDEX idx_analytics_sentiment ON analytics(sentiment);
+CREATE INDEX idx_opinions_submitted ON opinions(submitted_at DESC, opinion_id DESC);
+CREATE INDEX idx_opinions_target_submitted ON opinions(target_id, submitted_at DESC, opinion_id DESC);
+CREATE INDEX idx_responses_submitted ON feedback_responses(submitted_at DESC, response_id DESC);
+CREATE INDEX idx_analytics_analyzed ON analytics(analyzed_at, analytics_id);
+CREATE INDEX idx_ledger_blocks_timestamp ON ledger_blocks(timestamp);
+CREATE INDEX idx_ledger_refs_height ON ledger_refs(height, position);
+CREATE INDEX idx_scoring_jobs_available ON scoring_jobs(available_at) WHERE status <> 'failed';
 
 -- ==================== SAMPLE DATA ====================
 INSERT INTO feedback_responses (response_id, form_id, submitted_by)
@@ -115,10 +279,12 @@ VALUES ('00000000-0000-0000-0000-000000000400', '00000000-0000-0000-0000-0000000
 INSERT INTO response_answers (answer_id, response_id, question_id, answer_text)
 VALUES ('00000000-0000-0000-0000-000000000401', '00000000-0000-0000-0000-000000000400', '00000000-0000-0000-0000-000000000301', 'Great work! Keep it up!');
 
-INSERT INTO analytics (analytics_id, result, engine_id, response_id)
+INSERT INTO analytics (analytics_id, result, sentiment, rating, engine_id, response_id)
 VALUES (
     '00000000-0000-0000-0000-000000000402',
     '{"type": "feedback", "sentiment": "positive", "rating": 5}'::jsonb,
+    'positive',
+    5,
     '00000000-0000-0000-0000-000000000100',
     '00000000-0000-0000-0000-000000000400'
 );
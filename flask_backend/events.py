@@ -0,0 +1,308 @@
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+import psycopg2
+from flask import Response
+
+from db import get_conn, listener
+from metrics import registry
+from pagination import encode_cursor
+
+STREAM_CHANNEL = "stream_events"
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "1000"))
+SSE_REPLAY_LIMIT = int(os.getenv("SSE_REPLAY_LIMIT", "1000"))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "2000"))
+# Each open stream holds a gthread thread (idle on its queue, no database
+# connection), so by default every worker thread but SSE_RESERVED_THREADS may
+# stream. The limit is per worker: a deployment serves WEB_CONCURRENCY times
+# as many streams. Streams also end after SSE_MAX_STREAM_SECONDS (the browser
+# reconnects and resumes) so a draining worker is not held past gunicorn's
+# graceful_timeout.
+SSE_RESERVED_THREADS = int(os.getenv("SSE_RESERVED_THREADS", "8"))
+SSE_MAX_SUBSCRIBERS = int(os.getenv(
+    "SSE_MAX_SUBSCRIBERS", str(max(1, int(os.getenv("GUNICORN_THREADS", "32")) - SSE_RESERVED_THREADS))
+))
+SSE_MAX_STREAM_SECONDS = float(os.getenv("SSE_MAX_STREAM_SECONDS", "25"))
+# Rows commit in a different order than their NOW() timestamps, so a resume
+# re-sends this much history before the cursor; clients apply events by id.
+SSE_RESUME_GRACE = float(os.getenv("SSE_RESUME_GRACE", "5"))
+
+# Rows are (ts, id, kind, ref, json). "opinion" matches /api/opinions,
+# "feedback" matches /api/admin/feedbacks and "score" updates an opinion.
+OPINION_EVENTS_SQL = """
+    SELECT o.submitted_at, o.opinion_id::text, 'opinion', o.opinion_id::text,
+           json_build_object(
+               'id', o.opinion_id,
+               'author', o.submitted_by,
+               'content', o.content,
+               'timestamp', o.submitted_at,
+               'target', t.name,
+               'category', t.category,
+               'sentiment', a.sentiment,
+               'rating', a.rating
+           )::text
+    FROM opinions o
+    LEFT JOIN opinion_targets t ON o.target_id = t.target_id
+    LEFT JOIN analytics a ON o.opinion_id = a.opinion_id
+    WHERE {where}
+"""
+
+ANALYTICS_EVENTS_SQL = """
+    SELECT a.analyzed_at, a.analytics_id::text,
+           CASE WHEN a.response_id IS NULL THEN 'score' ELSE 'feedback' END,
+           COALESCE(a.opinion_id, a.response_id)::text,
+           CASE WHEN a.response_id IS NULL THEN json_build_object(
+               'opinion_id', a.opinion_id,
+               'sentiment', COALESCE(a.sentiment, a.result->>'sentiment'),
+               'rating', COALESCE(a.rating, (a.result->>'rating')::int)
+           ) ELSE json_build_object(
+               'response_id', fr.response_id,
+               'timestamp', fr.submitted_at,
+               'content', ra.answer_text,
+               'rating', COALESCE(a.rating, (a.result->>'rating')::int),
+               'sentiment', COALESCE(a.sentiment, a.result->>'sentiment')
+           ) END::text
+    FROM analytics a
+    LEFT JOIN feedback_responses fr ON fr.response_id = a.response_id
+    LEFT JOIN response_answers ra ON ra.response_id = a.response_id
+    WHERE {where}
+"""
+
+PUBLIC_KINDS = frozenset(("opinion", "score"))
+ADMIN_KINDS = frozenset(("opinion", "score", "feedback"))
+
+lagged_subscribers = registry.counter("sse_lagged_subscribers", "Streams closed because the client fell SSE_QUEUE_SIZE events behind.")
+
+
+def _frame(row):
+    ts, row_id, kind, _, doc = row
+    return f"id: {encode_cursor(ts, row_id)}\nevent: {kind}\ndata: {doc}\n\n"
+
+
+def _merge(cur, opinion_where, opinion_params, analytics_where, analytics_params, kinds, limit=None):
+    rows = []
+    tail, extra = (" ORDER BY {} LIMIT %s;", [limit]) if limit else (";", [])
+    if "opinion" in kinds and opinion_where:
+        sql = OPINION_EVENTS_SQL.format(where=opinion_where) + tail.format("o.submitted_at, o.opinion_id")
+        cur.execute(sql, opinion_params + extra)
+        rows += cur.fetchall()
+    if ("score" in kinds or "feedback" in kinds) and analytics_where:
+        if "feedback" not in kinds:
+            analytics_where += " AND a.opinion_id IS NOT NULL"
+        sql = ANALYTICS_EVENTS_SQL.format(where=analytics_where) + tail.format("a.analyzed_at, a.analytics_id")
+        cur.execute(sql, analytics_params + extra)
+        rows += cur.fetchall()
+    # An opinion row already carries its score (e.g. synchronous submissions).
+    opinions = {r[3] for r in rows if r[2] == "opinion"}
+    rows = [r for r in rows if r[2] != "score" or r[3] not in opinions]
+    rows.sort(key=lambda r: (r[0], r[1]))
+    return rows
+
+
+def fetch_ids(opinion_ids, analytics_ids, kinds=ADMIN_KINDS):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            return _merge(
+                cur,
+                "o.opinion_id = ANY(%s::uuid[])" if opinion_ids else None, [list(opinion_ids)],
+                "a.analytics_id = ANY(%s::uuid[])" if analytics_ids else None, [list(analytics_ids)],
+                kinds,
+            )
+
+
+def fetch_since(cursor, kinds, limit=SSE_REPLAY_LIMIT):
+    # Keyset replay of everything after `cursor` (minus the grace window).
+    # Returns (rows, truncated).
+    ts, row_id = cursor
+    since = [ts - timedelta(seconds=SSE_RESUME_GRACE), row_id]
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            rows = _merge(
+                cur,
+                "(o.submitted_at, o.opinion_id) > (%s, %s)", list(since),
+                "(a.analyzed_at, a.analytics_id) > (%s, %s)", list(since),
+                kinds, limit,
+            )
+    return rows[:limit], len(rows) >= limit
+
+
+class Subscriber:
+    def __init__(self, kinds, maxsize):
+        self.kinds = kinds
+        self.queue = queue.Queue(maxsize)
+        self.lagged = False
+
+
+class Broadcaster:
+    # Fans stream events out to every open SSE connection in this process from
+    # the shared db.listener: notifications carry row ids only, and each batch
+    # of them is fetched once and rendered once, however many clients listen.
+    def __init__(self, max_subscribers=SSE_MAX_SUBSCRIBERS, queue_size=SSE_QUEUE_SIZE):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.ready = threading.Event()
+        self._subscribers = set()
+        self._pending = ({}, {})
+        self._resync = False
+        self._last = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def subscribe(self, kinds):
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                return None
+            sub = Subscriber(kinds, self.queue_size)
+            self._subscribers.add(sub)
+            start = self._thread is None
+            if start:
+                self._thread = threading.Thread(target=self._run, name="sse-broadcaster", daemon=True)
+                self._thread.start()
+        if start:
+            # _on_reconnect sets `ready` once the listener thread has run LISTEN.
+            listener.subscribe(STREAM_CHANNEL, self._on_notify, on_reconnect=self._on_reconnect)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+            if not self._subscribers:
+                # Nothing is fetched while nobody listens, so there is nothing to resync.
+                self._last = None
+
+    def close(self):
+        # Ends every open stream; clients reconnect to another worker.
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(None)
+            except queue.Full:
+                sub.lagged = True
+        self._wake.set()
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _on_notify(self, payload):
+        try:
+            message = json.loads(payload)
+            index = 0 if message["kind"] == "opinion" else 1
+            ids = message["ids"]
+        except (ValueError, KeyError, TypeError):
+            return
+        with self._lock:
+            if not self._subscribers:
+                return
+            self._pending[index].update(dict.fromkeys(ids))
+        self._wake.set()
+
+    def _on_reconnect(self):
+        # Notifications sent while the listener was down are lost; replay them.
+        with self._lock:
+            self._resync = self._last is not None
+        self.ready.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                opinion_ids, analytics_ids = self._pending
+                self._pending = ({}, {})
+                resync, self._resync = self._resync, False
+                if not self._subscribers:
+                    continue
+            try:
+                rows = fetch_ids(opinion_ids, analytics_ids) if opinion_ids or analytics_ids else []
+                reset = False
+                if resync:
+                    replayed, reset = fetch_since(self._last, ADMIN_KINDS)
+                    rows = replayed + rows
+            except psycopg2.Error:
+                traceback.print_exc()
+                continue
+            self._publish(rows, reset)
+
+    def _publish(self, rows, reset=False):
+        events = [(r[2], _frame(r)) for r in rows]
+        if reset:
+            events.append((None, "event: reset\ndata: {}\n\n"))
+        if rows:
+            newest = max((r[0], r[1]) for r in rows)
+            if self._last is None or newest > self._last:
+                self._last = newest
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            for kind, frame in events:
+                if kind is not None and kind not in sub.kinds:
+                    continue
+                try:
+                    sub.queue.put_nowait(frame)
+                except queue.Full:
+                    # The stream is closed and the client resumes from its last id.
+                    sub.lagged = True
+                    lagged_subscribers.inc()
+                    break
+
+
+broadcaster = Broadcaster()
+registry.gauge("sse_subscribers", "Open server-sent event streams in this process.", broadcaster.subscriber_count)
+
+
+def stream(kinds, cursor=None):
+    # Returns None when this process is already serving SSE_MAX_SUBSCRIBERS streams.
+    sub = broadcaster.subscribe(kinds)
+    if sub is None:
+        return None
+
+    def generate():
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        if cursor:
+            # LISTEN must be active before the replay query, or rows committed
+            # in between would be neither replayed nor notified.
+            broadcaster.ready.wait(SSE_HEARTBEAT)
+            try:
+                rows, truncated = fetch_since(cursor, kinds)
+            except psycopg2.Error:
+                # Includes PoolTimeout. The client refetches and reconnects.
+                traceback.print_exc()
+                yield "event: reset\ndata: {}\n\n"
+                return
+            if truncated:
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                for row in rows:
+                    yield _frame(row)
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        while not sub.lagged:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                frame = sub.queue.get(timeout=min(SSE_HEARTBEAT, remaining))
+            except queue.Empty:
+                # Keeps proxies from timing out and surfaces closed connections.
+                yield ": keepalive\n\n"
+                continue
+            if frame is None:
+                return
+            yield frame
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    # Runs even if the client disconnects before the generator starts.
+    resp.call_on_close(lambda: broadcaster.unsubscribe(sub))
+    return resp
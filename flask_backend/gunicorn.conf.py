@@ -0,0 +1,63 @@
+# gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# Pre-fork WSGI serving. The app is not preloaded: each worker imports app.py
+# and builds its own pool, ledger sealer, scorer and background threads after
+# the fork. Cross-worker state lives in Postgres (advisory-locked ledger
+# appends, SKIP LOCKED scoring queue, LISTEN/NOTIFY cache invalidation and
+# live streams). Metrics are per process; with METRICS_DIR set each worker
+# writes a snapshot there and any worker's /metrics merges all of them.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(8, multiprocessing.cpu_count() * 2 + 1))))
+worker_class = "gthread"
+# Open /api/*/stream connections each hold one of these while idle, so
+# there are more threads than pooled connections: all but
+# SSE_RESERVED_THREADS of them may stream (SSE_MAX_SUBSCRIBERS, per worker).
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# Must exceed SHUTDOWN_TIMEOUT so a worker can drain scoring before it is killed.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+
+def on_starting(server):
+    # Migrate and backfill once in the master instead of racing in every
+    # worker (and again whenever max_requests recycles one).
+    import metrics
+    from db import get_pool
+    from schema import backfill_analytics, ensure_schema
+
+    ensure_schema()
+    if os.getenv("ANALYTICS_BACKFILL_ON_START", "1") == "1":
+        server.log.info("Backfilled %d analytics rows", backfill_analytics())
+    get_pool().closeall()
+    os.environ["SCHEMA_ON_START"] = "0"
+    os.environ["ANALYTICS_BACKFILL_ON_START"] = "0"
+    if metrics.METRICS_DIR:
+        # Snapshots from a previous run would be merged into this one's totals.
+        metrics.clear_snapshots()
+
+
+def post_fork(server, worker):
+    # Keep the MemoryStore ledger honest: it would silently diverge per worker.
+    if os.getenv("LEDGER_STORE", "postgres") == "memory" and workers > 1:
+        server.log.warning("LEDGER_STORE=memory keeps a separate ledger in every worker")
+
+
+def worker_exit(server, worker):
+    import app
+
+    app.shutdown()
+
+
+def child_exit(server, worker):
+    # Runs in the master once the worker is gone.
+    import metrics
+
+    if metrics.METRICS_DIR:
+        metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,80 @@
+import os
+import uuid
+
+from cache import get_cache, notify_invalidation
+from sentiment import resolve_engine_id
+
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "300"))
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "10000"))
+
+engines = get_cache("engines", 64, LOOKUP_CACHE_TTL)
+targets = get_cache("targets", LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL)
+feedback = get_cache("feedback_defaults", 4, LOOKUP_CACHE_TTL)
+
+# Rows this transaction inserts itself are not cached: if it rolls back, the
+# cached id would point at nothing. The next lookup finds the committed row.
+
+
+def engine_id(cur, engine):
+    key = (engine.name, engine.version)
+    cached = engines.get(key)
+    if cached is not None:
+        return cached
+    cur.execute("SELECT engine_id FROM engines WHERE name = %s AND version = %s LIMIT 1;", key)
+    row = cur.fetchone()
+    if row is None:
+        return resolve_engine_id(cur, engine)
+    engines.set(key, row[0])
+    return row[0]
+
+
+def target_exists(cur, target_id):
+    cached = targets.get(target_id)
+    if cached is not None:
+        return cached
+    cur.execute("SELECT 1 FROM opinion_targets WHERE target_id = %s;", (target_id,))
+    exists = cur.fetchone() is not None
+    targets.set(target_id, exists)
+    return exists
+
+
+def target_created(cur, target_id):
+    # Drops a cached "does not exist" here and, once committed, in every other worker.
+    notify_invalidation(cur, "targets", target_id)
+
+
+def feedback_defaults(cur, created_by):
+    cached = feedback.get("default")
+    if cached is not None:
+        return cached
+    inserted = False
+    cur.execute("SELECT form_id FROM feedback_forms LIMIT 1;")
+    form = cur.fetchone()
+    if form:
+        form_id = form[0]
+    else:
+        form_id = str(uuid.uuid4())
+        inserted = True
+        # The author may not have been inserted yet on single-statement write paths.
+        cur.execute(
+            "INSERT INTO users (user_id, name) VALUES (%s, 'AutoUser-' || %s) ON CONFLICT DO NOTHING;",
+            (created_by, created_by),
+        )
+        cur.execute(
+            "INSERT INTO feedback_forms (form_id, created_by, title) VALUES (%s, %s, %s);",
+            (form_id, created_by, "Default Feedback Form"),
+        )
+    cur.execute("SELECT question_id FROM questions LIMIT 1;")
+    question = cur.fetchone()
+    if question:
+        question_id = question[0]
+    else:
+        question_id = str(uuid.uuid4())
+        inserted = True
+        cur.execute(
+            "INSERT INTO questions (question_id, form_id, question_text) VALUES (%s, %s, %s);",
+            (question_id, form_id, "What is your feedback?"),
+        )
+    if not inserted:
+        feedback.set("default", (form_id, question_id))
+    return form_id, question_id
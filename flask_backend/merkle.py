@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+# Leaves and inner nodes are hashed with different prefixes so an inner node
+# can never be passed off as a leaf.
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"), check_circular=False)
+
+
+def leaf_hash(data):
+    payload = _encoder.encode(data).encode()
+    return hashlib.sha256(LEAF_PREFIX + payload).hexdigest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def _next_level(level):
+    # An odd node is promoted unchanged instead of being paired with itself.
+    out = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        out.append(level[-1])
+    return out
+
+
+def merkle_root(leaves):
+    if not leaves:
+        return hashlib.sha256(b"").hexdigest()
+    level = list(leaves)
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+
+def merkle_proof(leaves, index):
+    proof = []
+    level = list(leaves)
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"hash": level[sibling], "side": "left" if sibling < index else "right"})
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    h = leaf
+    for step in proof:
+        h = node_hash(step["hash"], h) if step["side"] == "left" else node_hash(h, step["hash"])
+    return h == root
@@ -0,0 +1,311 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import traceback
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# With pre-fork workers each process has its own registry. When METRICS_DIR is
+# set every process writes a <pid>.json snapshot there and /metrics merges them
+# (see exposition()); gunicorn.conf.py clears the directory on start.
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_SNAPSHOT_SECONDS = float(os.getenv("METRICS_SNAPSHOT_SECONDS", "5"))
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def _read(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    def snapshot(self):
+        counts, count, total, peak = self._read()
+        cumulative, buckets = 0, {}
+        for le, c in zip(self.buckets + (float("inf"),), counts):
+            cumulative += c
+            buckets["+Inf" if le == float("inf") else str(le)] = cumulative
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "avg": round(total / count, 6) if count else 0.0,
+            "max": round(peak, 6),
+            "buckets": buckets,
+        }
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Family:
+    # A metric with labels: one child Histogram/Counter per label combination.
+    def __init__(self, kind, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+                    self._children[key] = child
+        return child
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            yield dict(zip(self.labelnames, key)), child
+
+
+class CallbackGauge:
+    # fn is called at scrape time and returns a number, or {label values: number}.
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.fn()
+        for key, v in (value.items() if isinstance(value, dict) else [((), value)]):
+            key = key if isinstance(key, tuple) else (key,)
+            yield dict(zip(self.labelnames, key)), v
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, name, metric):
+        with self._lock:
+            if name in self._metrics:
+                return self._metrics[name]
+            self._metrics[name] = metric
+            return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(name, Family("histogram", name, help, labelnames, buckets))
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(name, Family("counter", name, help, labelnames))
+
+    def register_histogram(self, name, help, histogram):
+        # Exposes a Histogram owned elsewhere (e.g. the pool's wait time).
+        family = Family("histogram", name, help)
+        family._children[()] = histogram
+        with self._lock:
+            self._metrics[name] = family
+        return family
+
+    def gauge(self, name, help, fn, labelnames=()):
+        return self._add(name, CallbackGauge(name, help, fn, labelnames))
+
+    def collect(self):
+        # [(name, kind, help, [(labels, value)])]; a histogram value is
+        # {"buckets", "counts", "count", "sum", "max"}. JSON-serialisable.
+        with self._lock:
+            metrics = list(self._metrics.items())
+        families = []
+        for name, metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                # A gauge whose source is unavailable (e.g. no database yet) is skipped.
+                continue
+            values = []
+            for labels, child in samples:
+                if metric.kind == "gauge":
+                    values.append((labels, child))
+                elif metric.kind == "counter":
+                    values.append((labels, child.value))
+                else:
+                    counts, count, total, peak = child._read()
+                    values.append((labels, {"buckets": list(child.buckets), "counts": counts, "count": count, "sum": total, "max": peak}))
+            families.append((name, metric.kind, metric.help, values))
+        return families
+
+    def render(self):
+        return _format(self.collect())
+
+
+def _format(families):
+    lines = []
+    for name, kind, help, samples in families:
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            if kind == "gauge":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            if kind == "counter":
+                lines.append(f"{name}_total{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for le, c in zip(value["buckets"] + [float("inf")], value["counts"]):
+                cumulative += c
+                lines.append(f"{name}_bucket{_labels(labels, {'le': _number(le)})} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(directory=METRICS_DIR, reg=None):
+    # Atomic, so a concurrent merge never reads a partial file.
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump((reg or registry).collect(), f)
+    os.replace(tmp, path)
+
+
+def mark_process_dead(pid, directory=METRICS_DIR):
+    # Counters and histograms of an exited worker keep counting towards the
+    # totals (they must not go backwards); its gauges no longer describe anything.
+    path = os.path.join(directory, f"{pid}.json")
+    try:
+        with open(path) as f:
+            families = json.load(f)
+    except (OSError, ValueError):
+        return
+    with open(f"{path}.tmp", "w") as f:
+        json.dump([family for family in families if family[1] != "gauge"], f)
+    os.replace(f"{path}.tmp", path)
+
+
+def clear_snapshots(directory=METRICS_DIR):
+    for path in glob.glob(os.path.join(directory, "*.json*")):
+        os.remove(path)
+
+
+def merge_snapshots(directory=METRICS_DIR):
+    # Counters and histograms are summed per label set across processes;
+    # gauges are per process and keep them apart with a pid label.
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        pid = os.path.basename(path)[:-len(".json")]
+        try:
+            with open(path) as f:
+                families = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, kind, help, samples in families:
+            _, _, _, values = merged.setdefault(name, (name, kind, help, {}))
+            for labels, value in samples:
+                if kind == "gauge":
+                    labels = dict(labels, pid=pid)
+                key = tuple(labels.items())
+                current = values.get(key)
+                if current is None:
+                    values[key] = (labels, value)
+                elif kind == "counter":
+                    values[key] = (labels, current[1] + value)
+                elif kind == "histogram" and current[1]["buckets"] == value["buckets"]:
+                    total = current[1]
+                    values[key] = (labels, {
+                        "buckets": total["buckets"],
+                        "counts": [a + b for a, b in zip(total["counts"], value["counts"])],
+                        "count": total["count"] + value["count"],
+                        "sum": total["sum"] + value["sum"],
+                        "max": max(total["max"], value["max"]),
+                    })
+    return [(name, kind, help, list(values.values())) for name, kind, help, values in merged.values()]
+
+
+def exposition():
+    # The /metrics body: this process alone, or every worker when METRICS_DIR is set.
+    if not METRICS_DIR:
+        return registry.render()
+    write_snapshot(METRICS_DIR)
+    return _format(merge_snapshots(METRICS_DIR))
+
+
+class SnapshotWriter:
+    # Keeps this process's snapshot fresh for scrapes served by other workers.
+    def __init__(self, interval=METRICS_SNAPSHOT_SECONDS, directory=METRICS_DIR):
+        self.interval = interval
+        self.directory = directory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.directory and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            # Final counts, so nothing observed since the last write is lost.
+            write_snapshot(self.directory)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_snapshot(self.directory)
+            except OSError:
+                traceback.print_exc()
+
+
+registry = Registry()
+snapshots = SnapshotWriter()
@@ -0,0 +1,144 @@
+import logging
+import os
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+ONNX_DIR = os.getenv("SENTIMENT_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "onnx"))
+# 0 leaves the choice to ONNX Runtime (one intra-op thread per physical core).
+INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+MODEL_FILE = "model.onnx"
+QUANTIZED_FILE = "model.int8.onnx"
+
+PARITY_TEXTS = [
+    "This app is absolutely amazing 🔥🔥 I love the design!",
+    "Ugh, it's so buggy and laggy 😡 hate it.",
+    "The UI is okay, not too bad.",
+    "Worst app ever. Crashes every time.",
+    "Bro this is too good to be true 😂👏👏",
+    "Delivery was on time.",
+    "I waited two weeks and nobody answered my emails.",
+    "Not sure how I feel about the new pricing.",
+]
+
+
+def export(source, target_dir=ONNX_DIR, quantize=False, offline=False, opset=17):
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    log.info("Exporting %s to ONNX (%s)", source, target_dir)
+    tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=offline)
+    model = AutoModelForSequenceClassification.from_pretrained(source, local_files_only=offline).eval()
+    os.makedirs(target_dir, exist_ok=True)
+    tokenizer.save_pretrained(target_dir)
+    model.config.save_pretrained(target_dir)
+    sample = tokenizer(["export"], return_tensors="pt")
+    path = os.path.join(target_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(path, os.path.join(target_dir, QUANTIZED_FILE), weight_type=QuantType.QInt8)
+    return target_dir
+
+
+class OnnxSentiment:
+    # Called like the transformers pipeline and returns the same
+    # [{"label", "score"}] records, so ai.to_rating applies unchanged.
+    def __init__(self, model_dir=ONNX_DIR, quantized=False, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        path = os.path.join(model_dir, QUANTIZED_FILE if quantized else MODEL_FILE)
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+        self.labels = AutoConfig.from_pretrained(model_dir, local_files_only=True).id2label
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, texts, batch_size=None, truncation=True, max_length=None, padding=True):
+        out = []
+        step = batch_size or len(texts) or 1
+        for i in range(0, len(texts), step):
+            encoded = self.tokenizer(texts[i:i + step], truncation=truncation, max_length=max_length, padding=padding, return_tensors="np")
+            feed = {k: v.astype(np.int64) for k, v in encoded.items() if k in self._inputs}
+            logits = self.session.run(None, feed)[0]
+            # Softmax, as the pipeline does for single-label classifiers.
+            exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+            probs = exp / exp.sum(axis=-1, keepdims=True)
+            for row in probs:
+                best = int(row.argmax())
+                out.append({"label": self.labels[best], "score": float(row[best])})
+        return out
+
+
+def load(source, quantize=False, offline=False, model_dir=ONNX_DIR):
+    # Exports on first use unless an exported model is already on disk.
+    path = os.path.join(model_dir, QUANTIZED_FILE if quantize else MODEL_FILE)
+    if not os.path.exists(path):
+        if offline:
+            raise FileNotFoundError(f"No exported ONNX model at {path}; run `python onnx_backend.py export`")
+        export(source, model_dir, quantize=quantize)
+    log.info("Loading ONNX Runtime model %s", path)
+    return OnnxSentiment(model_dir, quantized=quantize)
+
+
+def parity(texts=PARITY_TEXTS, quantize=False, tolerance=1e-3, model_dir=ONNX_DIR):
+    # Compares ONNX Runtime against the PyTorch pipeline on the same preprocessed inputs.
+    import ai
+
+    inputs = ai.preprocess_many(texts)
+    torch_out = [ai.to_rating(o["label"], o["score"]) for o in ai.load_model(quantize=False)(inputs, truncation=True, max_length=ai.MAX_TOKENS, padding=True)]
+    onnx_model = load(ai.MODEL_DIR or ai.MODEL_NAME, quantize=quantize, offline=ai.OFFLINE, model_dir=model_dir)
+    onnx_out = [ai.to_rating(o["label"], o["score"]) for o in onnx_model(inputs, max_length=ai.MAX_TOKENS)]
+    mismatches = [
+        {"text": t, "torch": a, "onnx": b}
+        for t, a, b in zip(texts, torch_out, onnx_out)
+        if (a["sentiment"], a["rating"]) != (b["sentiment"], b["rating"])
+    ]
+    max_diff = max(abs(a["score"] - b["score"]) for a, b in zip(torch_out, onnx_out))
+    # Quantized models are only expected to agree on labels, not on scores.
+    ok = not mismatches and (quantize or max_diff <= tolerance)
+    return {"ok": ok, "texts": len(texts), "max_score_diff": max_diff, "mismatches": mismatches}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--source", help="hub id or local checkpoint (defaults to SENTIMENT_MODEL_DIR / SENTIMENT_MODEL)")
+    parser.add_argument("--dir", default=ONNX_DIR)
+    parser.add_argument("--int8", action="store_true", help="also write / compare the dynamically quantized model")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "export":
+        import ai
+        export(args.source or ai.MODEL_DIR or ai.MODEL_NAME, args.dir, quantize=args.int8, offline=ai.OFFLINE)
+        print(f"✅ Exported to {args.dir}")
+    else:
+        report = parity(quantize=args.int8, model_dir=args.dir)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["ok"] else 1)
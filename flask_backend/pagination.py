@@ -0,0 +1,162 @@
+import base64
+import os
+import uuid
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+from db import get_conn
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "100"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "2000"))
+
+
+class PageError(ValueError):
+    pass
+
+
+def encode_cursor(ts, row_id):
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), str(uuid.UUID(row_id))
+    except ValueError:
+        raise PageError(f"Invalid cursor: {cursor}")
+
+
+def _parse_time(name, value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise PageError(f"Invalid {name}: {value}")
+
+
+class Page:
+    def __init__(self, limit=DEFAULT_PAGE_SIZE, cursor=None, target_id=None, sentiment=None, since=None, until=None, fmt="json", stream=False):
+        self.limit = limit
+        self.cursor = cursor
+        self.target_id = target_id
+        self.sentiment = sentiment
+        self.since = since
+        self.until = until
+        self.fmt = fmt
+        self.stream = stream or fmt == "ndjson"
+
+    @classmethod
+    def from_args(cls, args):
+        fmt = args.get("format", "json")
+        if fmt not in ("json", "ndjson"):
+            raise PageError(f"Invalid format: {fmt}")
+        stream = fmt == "ndjson" or args.get("stream") in ("1", "true")
+        limit = args.get("limit")
+        if limit is None:
+            # Streams are exports and default to the whole (filtered) range.
+            limit = None if stream else DEFAULT_PAGE_SIZE
+        else:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise PageError(f"Invalid limit: {limit}")
+            if limit < 1:
+                raise PageError(f"Invalid limit: {limit}")
+            if not stream:
+                limit = min(limit, MAX_PAGE_SIZE)
+        target_id = args.get("target_id")
+        if target_id:
+            try:
+                target_id = str(uuid.UUID(target_id))
+            except ValueError:
+                raise PageError(f"Invalid target_id: {target_id}")
+        return cls(
+            limit=limit,
+            cursor=decode_cursor(args["cursor"]) if args.get("cursor") else None,
+            target_id=target_id,
+            sentiment=args.get("sentiment") or None,
+            since=_parse_time("since", args.get("since")),
+            until=_parse_time("until", args.get("until")),
+            fmt=fmt,
+            stream=stream,
+        )
+
+    def where(self, ts_col, id_col, target_col=None, sentiment_col=None):
+        clauses, params = [], []
+        if self.cursor:
+            clauses.append(f"({ts_col}, {id_col}) < (%s, %s)")
+            params.extend(self.cursor)
+        if self.target_id and target_col:
+            clauses.append(f"{target_col} = %s")
+            params.append(self.target_id)
+        if self.sentiment and sentiment_col:
+            clauses.append(f"{sentiment_col} = %s")
+            params.append(self.sentiment)
+        if self.since:
+            clauses.append(f"{ts_col} >= %s")
+            params.append(self.since)
+        if self.until:
+            clauses.append(f"{ts_col} < %s")
+            params.append(self.until)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def order_limit(self, ts_col, id_col):
+        sql = f"ORDER BY {ts_col} DESC, {id_col} DESC"
+        if self.limit is None:
+            return sql, []
+        # One extra row tells us whether there is a next page.
+        return sql + " LIMIT %s", [self.limit if self.stream else self.limit + 1]
+
+    def query(self, sql, ts_col, id_col, target_col=None, sentiment_col=None):
+        where, params = self.where(ts_col, id_col, target_col, sentiment_col)
+        order, order_params = self.order_limit(ts_col, id_col)
+        return sql.format(where=where) + " " + order + ";", params + order_params
+
+
+# List queries select (json_document::text, submitted_at, id): the database
+# renders each row as JSON, so rows are written out without decoding them.
+def fetch_page(page, sql, params):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+    next_cursor = None
+    if page.limit is not None and len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][2])
+    resp = Response("[" + ",".join(r[0] for r in rows) + "]", mimetype="application/json")
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+    return resp
+
+
+def stream_rows(page, sql, params):
+    def generate():
+        with get_conn() as conn:
+            # A named cursor keeps the result set on the server and fetches it in chunks.
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                cur.itersize = STREAM_FETCH_SIZE
+                cur.execute(sql, params)
+                if page.fmt == "ndjson":
+                    for row in cur:
+                        yield row[0] + "\n"
+                    return
+                yield "["
+                sep = ""
+                for row in cur:
+                    yield sep + row[0]
+                    sep = ","
+                yield "]"
+
+    mimetype = "application/x-ndjson" if page.fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def list_response(page, sql, params):
+    if page.stream:
+        return stream_rows(page, sql, params)
+    return fetch_page(page, sql, params)
@@ -0,0 +1,75 @@
+import collections
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Opt-in: PROFILE_SLOW_MS > 0 samples every request thread and keeps the stacks
+# of requests slower than the threshold.
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+def _folded(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler:
+    # Samples the stacks of threads that are inside a request every
+    # `interval` seconds. Requests that end up slower than `threshold` are
+    # written out in folded-stack format ("a;b;c <count>"), which flamegraph.pl,
+    # speedscope and inferno read directly.
+    def __init__(self, threshold, interval=0.005, out_dir=PROFILE_DIR):
+        self.threshold = threshold
+        self.interval = interval
+        self.out_dir = out_dir
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = collections.Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, name, elapsed):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and elapsed >= self.threshold:
+            return self._write(name, elapsed, samples)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in active.items():
+                frame = frames.get(ident)
+                if frame is not None and ident != me:
+                    samples[_folded(frame)] += 1
+
+    def _write(self, name, elapsed, samples):
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = re.sub(r"[^\w.-]+", "_", name).strip("_") or "request"
+        path = os.path.join(self.out_dir, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{slug}-{int(elapsed * 1000)}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+profiler = SamplingProfiler(PROFILE_SLOW_MS / 1000, PROFILE_INTERVAL_MS / 1000) if PROFILE_SLOW_MS > 0 else None
@@ -0,0 +1,232 @@
+import sys
+
+from db import get_conn
+
+# Serialises migrations when several workers start at once; DDL such as
+# CREATE OR REPLACE TRIGGER would otherwise deadlock or fail on concurrent runs.
+SCHEMA_LOCK_KEY = 0x6E756C6D  # "nulm"
+
+# Counters are spread over 16 shards per name so concurrent writers rarely
+# wait on the same row; readers sum the shards. Feedback rollups use the
+# all-zero target id.
+STATS_SQL = """
+CREATE TABLE IF NOT EXISTS stats_counters (
+    name TEXT NOT NULL,
+    shard SMALLINT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+CREATE TABLE IF NOT EXISTS sentiment_rollups (
+    target_id UUID NOT NULL,
+    bucket_size TEXT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    sentiment TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (target_id, bucket_size, bucket, sentiment)
+);
+
+CREATE OR REPLACE FUNCTION stats_count_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO stats_counters (name, shard, value)
+    SELECT TG_ARGV[0], floor(random() * 16)::smallint, COUNT(*) FROM new_rows
+    ON CONFLICT (name, shard) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stats_count_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO stats_counters (name, shard, value)
+    SELECT TG_ARGV[0], floor(random() * 16)::smallint, -COUNT(*) FROM old_rows
+    ON CONFLICT (name, shard) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stats_rollup_analytics() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sentiment_rollups (target_id, bucket_size, bucket, sentiment, count, rating_sum)
+    SELECT COALESCE(o.target_id, '00000000-0000-0000-0000-000000000000'::uuid),
+           b.size,
+           date_trunc(b.size, COALESCE(o.submitted_at, fr.submitted_at, n.analyzed_at)),
+           COALESCE(n.sentiment, n.result->>'sentiment'),
+           COUNT(*),
+           COALESCE(SUM(COALESCE(n.rating, CASE WHEN n.result->>'rating' ~ '^-?[0-9]{1,9}$' THEN (n.result->>'rating')::int END)), 0)
+    FROM new_rows n
+    LEFT JOIN opinions o ON o.opinion_id = n.opinion_id
+    LEFT JOIN feedback_responses fr ON fr.response_id = n.response_id
+    CROSS JOIN (VALUES ('hour'), ('day')) AS b(size)
+    WHERE n.sentiment IS NOT NULL OR jsonb_typeof(n.result->'sentiment') = 'string'
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (target_id, bucket_size, bucket, sentiment) DO UPDATE
+    SET count = sentiment_rollups.count + EXCLUDED.count,
+        rating_sum = sentiment_rollups.rating_sum + EXCLUDED.rating_sum;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER users_count_insert AFTER INSERT ON users REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('users');
+CREATE OR REPLACE TRIGGER users_count_delete AFTER DELETE ON users REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('users');
+CREATE OR REPLACE TRIGGER opinions_count_insert AFTER INSERT ON opinions REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('opinions');
+CREATE OR REPLACE TRIGGER opinions_count_delete AFTER DELETE ON opinions REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('opinions');
+CREATE OR REPLACE TRIGGER feedback_responses_count_insert AFTER INSERT ON feedback_responses REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('feedbacks');
+CREATE OR REPLACE TRIGGER feedback_responses_count_delete AFTER DELETE ON feedback_responses REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('feedbacks');
+CREATE OR REPLACE TRIGGER opinion_targets_count_insert AFTER INSERT ON opinion_targets REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_insert('targets');
+CREATE OR REPLACE TRIGGER opinion_targets_count_delete AFTER DELETE ON opinion_targets REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_delete('targets');
+CREATE OR REPLACE TRIGGER analytics_rollup AFTER INSERT ON analytics REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_rollup_analytics();
+"""
+
+# Row ids for the live stream (events.py), 150 per payload since NOTIFY
+# payloads are capped at 8000 bytes. Delivered on commit only.
+STREAM_SQL = """
+CREATE OR REPLACE FUNCTION stream_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_ARGV[0] = 'opinion' THEN
+        PERFORM pg_notify('stream_events', json_build_object('kind', 'opinion', 'ids', json_agg(opinion_id))::text)
+        FROM (SELECT opinion_id, (row_number() OVER () - 1) / 150 AS chunk FROM new_rows) c
+        GROUP BY chunk;
+    ELSE
+        PERFORM pg_notify('stream_events', json_build_object('kind', 'analytics', 'ids', json_agg(analytics_id))::text)
+        FROM (SELECT analytics_id, (row_number() OVER () - 1) / 150 AS chunk FROM new_rows) c
+        GROUP BY chunk;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER opinions_stream AFTER INSERT ON opinions REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stream_notify('opinion');
+CREATE OR REPLACE TRIGGER analytics_stream AFTER INSERT ON analytics REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stream_notify('analytics');
+"""
+
+STATS_BACKFILL_SQL = """
+INSERT INTO stats_counters (name, shard, value)
+SELECT 'users', 0, COUNT(*) FROM users
+UNION ALL SELECT 'opinions', 0, COUNT(*) FROM opinions
+UNION ALL SELECT 'feedbacks', 0, COUNT(*) FROM feedback_responses
+UNION ALL SELECT 'targets', 0, COUNT(*) FROM opinion_targets;
+
+INSERT INTO sentiment_rollups (target_id, bucket_size, bucket, sentiment, count, rating_sum)
+SELECT COALESCE(o.target_id, '00000000-0000-0000-0000-000000000000'::uuid),
+       b.size,
+       date_trunc(b.size, COALESCE(o.submitted_at, fr.submitted_at, a.analyzed_at)),
+       a.result->>'sentiment',
+       COUNT(*),
+       COALESCE(SUM(CASE WHEN a.result->>'rating' ~ '^-?[0-9]{1,9}$' THEN (a.result->>'rating')::int END), 0)
+FROM analytics a
+LEFT JOIN opinions o ON o.opinion_id = a.opinion_id
+LEFT JOIN feedback_responses fr ON fr.response_id = a.response_id
+CROSS JOIN (VALUES ('hour'), ('day')) AS b(size)
+WHERE jsonb_typeof(a.result->'sentiment') = 'string'
+GROUP BY 1, 2, 3, 4;
+"""
+
+
+def ensure_schema():
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (SCHEMA_LOCK_KEY,))
+            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS role TEXT DEFAULT 'user';")
+            cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS password TEXT;")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS scoring_jobs (
+                    job_id BIGSERIAL PRIMARY KEY,
+                    opinion_id UUID NOT NULL UNIQUE REFERENCES opinions(opinion_id) ON DELETE CASCADE,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INT NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    available_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                    locked_at TIMESTAMP,
+                    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+                );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_scoring_jobs_available ON scoring_jobs(available_at) WHERE status <> 'failed';")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_opinions_submitted ON opinions(submitted_at DESC, opinion_id DESC);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_opinions_target_submitted ON opinions(target_id, submitted_at DESC, opinion_id DESC);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_responses_submitted ON feedback_responses(submitted_at DESC, response_id DESC);")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS ledger_blocks (
+                    height BIGINT PRIMARY KEY,
+                    timestamp TIMESTAMP NOT NULL,
+                    data JSONB NOT NULL,
+                    prev_hash TEXT NOT NULL,
+                    hash TEXT NOT NULL UNIQUE
+                );
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS ledger_refs (
+                    ref_id UUID PRIMARY KEY,
+                    ref_type TEXT NOT NULL,
+                    height BIGINT NOT NULL REFERENCES ledger_blocks(height)
+                );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_ledger_blocks_timestamp ON ledger_blocks(timestamp);")
+            cur.execute("ALTER TABLE ledger_blocks ADD COLUMN IF NOT EXISTS version SMALLINT NOT NULL DEFAULT 1;")
+            cur.execute("ALTER TABLE ledger_refs ADD COLUMN IF NOT EXISTS position INT NOT NULL DEFAULT 0;")
+            cur.execute("ALTER TABLE ledger_refs ADD COLUMN IF NOT EXISTS leaf TEXT;")
+            cur.execute("ALTER TABLE ledger_refs ADD COLUMN IF NOT EXISTS data JSONB;")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_ledger_refs_height ON ledger_refs(height, position);")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+                    height BIGINT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    verified_at TIMESTAMP NOT NULL DEFAULT NOW()
+                );
+            """)
+            cur.execute("ALTER TABLE analytics ADD COLUMN IF NOT EXISTS sentiment TEXT;")
+            cur.execute("ALTER TABLE analytics ADD COLUMN IF NOT EXISTS rating SMALLINT;")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_analytics_sentiment ON analytics(sentiment);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_analytics_opinion_typed ON analytics(opinion_id) INCLUDE (sentiment, rating);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_analytics_response_typed ON analytics(response_id) INCLUDE (sentiment, rating);")
+            cur.execute("DROP INDEX IF EXISTS idx_analytics_opinion, idx_analytics_response;")
+            cur.execute("SELECT to_regclass('stats_counters') IS NULL;")
+            needs_backfill = cur.fetchone()[0]
+            cur.execute(STATS_SQL)
+            if needs_backfill:
+                cur.execute(STATS_BACKFILL_SQL)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_analytics_analyzed ON analytics(analyzed_at, analytics_id);")
+            cur.execute(STREAM_SQL)
+
+
+BACKFILL_BATCH_SQL = r"""
+    WITH batch AS (
+        SELECT analytics_id FROM analytics
+        WHERE analytics_id > %s AND sentiment IS NULL AND result ? 'sentiment'
+        ORDER BY analytics_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ), updated AS (
+        UPDATE analytics a
+        SET sentiment = a.result->>'sentiment',
+            rating = CASE WHEN a.result->>'rating' ~ '^-?\d{1,4}$' THEN (a.result->>'rating')::smallint END
+        FROM batch
+        WHERE a.analytics_id = batch.analytics_id
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM updated), (SELECT MAX(analytics_id::text) FROM batch);
+"""
+
+
+def backfill_analytics(batch_size=5000):
+    # Copies sentiment/rating out of the JSONB result in small committed
+    # batches so the table is never locked for long. SKIP LOCKED lets several
+    # processes run it at once. The keyset on analytics_id visits each row
+    # once, so rows that stay NULL (e.g. {"sentiment": null}) or carry a
+    # non-integer rating can't keep the loop going.
+    total, last = 0, "00000000-0000-0000-0000-000000000000"
+    while True:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(BACKFILL_BATCH_SQL, (last, batch_size))
+                updated, batch_last = cur.fetchone()
+        if batch_last is None:
+            return total
+        total += updated
+        last = batch_last
+
+if __name__ == "__main__":
+    ensure_schema()
+    if sys.argv[1:2] == ["backfill-analytics"]:
+        batch = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+        print(f"Backfilled {backfill_analytics(batch)} analytics rows")
@@ -0,0 +1,155 @@
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from textblob import TextBlob
+
+from metrics import registry
+
+score_seconds = registry.histogram("sentiment_score_duration_seconds", "Time to score one call's texts, by the engine that produced the result.", ("engine",))
+fallbacks = registry.counter("sentiment_fallbacks", "Calls answered by the fallback engine after the primary failed or timed out.", ("engine",))
+
+
+class SentimentEngine:
+    name = None
+    version = "1.0"
+
+    def score(self, text: str) -> dict:
+        raise NotImplementedError
+
+    def score_many(self, texts: list) -> list:
+        return [self.score(t) for t in texts]
+
+    def warmup(self):
+        pass
+
+
+class TextBlobEngine(SentimentEngine):
+    name = "TextBlob"
+
+    def score(self, text):
+        polarity = TextBlob(text).sentiment.polarity
+        sentiment, rating = "neutral", 3
+        if polarity > 0.3:
+            sentiment, rating = "positive", 5
+        elif polarity < -0.3:
+            sentiment, rating = "negative", 1
+        return {"sentiment": sentiment, "rating": rating}
+
+
+class RobertaEngine(SentimentEngine):
+    name = "RoBERTa"
+
+    def score(self, text):
+        return self.score_many([text])[0]
+
+    def score_many(self, texts):
+        import ai
+        return [{"sentiment": r["sentiment"], "rating": r["rating"]} for r in ai.analyze_many(texts)]
+
+    def warmup(self):
+        import ai
+        ai.warmup()
+
+
+ENGINES = {
+    "textblob": TextBlobEngine,
+    "roberta": RobertaEngine,
+}
+
+_instances = {}
+
+
+def get_engine(key: str) -> SentimentEngine:
+    key = key.lower()
+    if key not in ENGINES:
+        raise ValueError(f"Unknown sentiment engine: {key}")
+    if key not in _instances:
+        _instances[key] = ENGINES[key]()
+    return _instances[key]
+
+
+def _warmup(key):
+    get_engine(key).warmup()
+
+
+def _score_many(key, texts):
+    return get_engine(key).score_many(texts)
+
+
+def resolve_engine_id(cur, engine: SentimentEngine):
+    cur.execute("SELECT engine_id FROM engines WHERE name = %s AND version = %s LIMIT 1;", (engine.name, engine.version))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    engine_id = str(uuid.uuid4())
+    cur.execute("INSERT INTO engines (engine_id, name, version) VALUES (%s, %s, %s);", (engine_id, engine.name, engine.version))
+    return engine_id
+
+
+class Scorer:
+    def __init__(self, primary="textblob", fallback="textblob", executor="thread", workers=4, timeout=0.5):
+        self.primary_key = primary.lower()
+        self.fallback_key = fallback.lower()
+        self.primary = get_engine(self.primary_key)
+        self.fallback = get_engine(self.fallback_key)
+        self.timeout = timeout
+        self._executor = None
+        if executor == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sentiment")
+        elif executor == "process":
+            # Each child loads the primary engine once when it starts, not on its first request.
+            # Spawned, not forked: children start lazily on the first submit, from a
+            # worker already running listener, batcher and metrics threads whose
+            # locks a forked child would inherit mid-use.
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warmup, initargs=(self.primary_key,),
+            )
+        elif executor != "inline":
+            raise ValueError(f"Unknown sentiment executor: {executor}")
+
+    @classmethod
+    def from_env(cls):
+        timeout_ms = float(os.getenv("SENTIMENT_TIMEOUT_MS", "500"))
+        return cls(
+            primary=os.getenv("SENTIMENT_ENGINE", "textblob"),
+            fallback=os.getenv("SENTIMENT_FALLBACK_ENGINE", "textblob"),
+            executor=os.getenv("SENTIMENT_EXECUTOR", "thread"),
+            workers=int(os.getenv("SENTIMENT_WORKERS", "4")),
+            timeout=timeout_ms / 1000 if timeout_ms > 0 else None,
+        )
+
+    def score(self, text: str):
+        results, engine = self.score_many([text])
+        return results[0], engine
+
+    def score_many(self, texts: list, timeout=None):
+        # Returns the engine that actually produced the results so analytics rows point at it.
+        if not texts:
+            return [], self.primary
+        started = time.perf_counter()
+        results, engine = self._score_many(texts, timeout)
+        score_seconds.labels(engine.name).observe(time.perf_counter() - started)
+        return results, engine
+
+    def _score_many(self, texts, timeout):
+        if self._executor is None or self.primary_key == self.fallback_key:
+            return self.primary.score_many(texts), self.primary
+        future = self._executor.submit(_score_many, self.primary_key, texts)
+        try:
+            return future.result(timeout if timeout is not None else self.timeout), self.primary
+        except Exception:
+            future.cancel()
+            fallbacks.labels(self.primary.name).inc()
+            return self.fallback.score_many(texts), self.fallback
+
+    def warmup(self):
+        self.primary.warmup()
+        self.fallback.warmup()
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
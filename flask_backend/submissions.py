@@ -0,0 +1,83 @@
+import json
+import uuid
+
+import lookups
+
+# Upserts the author and inserts the opinion plus {then} in one round trip.
+INSERT_OPINION_SQL = """
+    WITH u AS (
+        INSERT INTO users (user_id, name)
+        SELECT %(user)s::uuid, 'AutoUser-' || %(user)s WHERE %(user)s IS NOT NULL
+        ON CONFLICT DO NOTHING
+    ), o AS (
+        INSERT INTO opinions (opinion_id, submitted_by, target_id, content)
+        VALUES (%(opinion_id)s, %(user)s, %(target_id)s, %(content)s)
+        RETURNING opinion_id
+    )
+    {then}
+"""
+
+INSERT_FEEDBACK_SQL = """
+    WITH u AS (
+        INSERT INTO users (user_id, name)
+        VALUES (%(user)s, 'AutoUser-' || %(user)s)
+        ON CONFLICT DO NOTHING
+    ), r AS (
+        INSERT INTO feedback_responses (response_id, form_id, submitted_by, submitted_at)
+        VALUES (%(response_id)s, %(form_id)s, %(user)s, NOW())
+        RETURNING response_id
+    ), a AS (
+        INSERT INTO response_answers (answer_id, response_id, question_id, answer_text)
+        SELECT %(answer_id)s, response_id, %(question_id)s, %(content)s FROM r
+    )
+    INSERT INTO analytics (analytics_id, result, sentiment, rating, engine_id, response_id, analyzed_at)
+    SELECT %(analytics_id)s, %(result)s, %(sentiment)s, %(rating)s, %(engine_id)s, response_id, NOW() FROM r;
+"""
+
+
+def insert_opinion(cur, submitted_by, target_id, content, sentiment, rating, engine):
+    opinion_id = str(uuid.uuid4())
+    cur.execute(INSERT_OPINION_SQL.format(then="""
+        INSERT INTO analytics (analytics_id, result, sentiment, rating, engine_id, opinion_id, analyzed_at)
+        SELECT %(analytics_id)s, %(result)s, %(sentiment)s, %(rating)s, %(engine_id)s, opinion_id, NOW() FROM o;
+    """), {
+        "user": submitted_by,
+        "opinion_id": opinion_id,
+        "target_id": target_id,
+        "content": content,
+        "analytics_id": str(uuid.uuid4()),
+        "result": json.dumps({"sentiment": sentiment, "rating": rating}),
+        "sentiment": sentiment,
+        "rating": rating,
+        "engine_id": lookups.engine_id(cur, engine),
+    })
+    return opinion_id
+
+
+def insert_pending_opinion(cur, submitted_by, target_id, content):
+    opinion_id = str(uuid.uuid4())
+    cur.execute(INSERT_OPINION_SQL.format(then="""
+        INSERT INTO scoring_jobs (opinion_id) SELECT opinion_id FROM o ON CONFLICT (opinion_id) DO NOTHING;
+    """), {"user": submitted_by, "opinion_id": opinion_id, "target_id": target_id, "content": content})
+    return opinion_id
+
+
+def insert_feedback(cur, submitted_by, content, sentiment, rating, engine):
+    # The form/question/engine ids come from the lookup caches, so with warm
+    # caches a submission is this one statement.
+    form_id, question_id = lookups.feedback_defaults(cur, submitted_by)
+    response_id = str(uuid.uuid4())
+    cur.execute(INSERT_FEEDBACK_SQL, {
+        "user": submitted_by,
+        "response_id": response_id,
+        "form_id": form_id,
+        "answer_id": str(uuid.uuid4()),
+        "question_id": question_id,
+        "content": content,
+        "analytics_id": str(uuid.uuid4()),
+        "result": json.dumps({"type": "feedback", "sentiment": sentiment, "rating": rating}),
+        "sentiment": sentiment,
+        "rating": rating,
+        "engine_id": lookups.engine_id(cur, engine),
+    })
+    return response_id
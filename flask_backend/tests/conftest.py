@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The backend modules import each other as top-level modules (run from flask_backend/).
+sys.path.insert(0, BACKEND)
+
+TEST_DB_NAME = "nulltrace_test"
+
+
+def _start_server():
+    # TEST_DB_HOST points at a disposable server (db.sql drops the public
+    # schema); otherwise an embedded one is started if pgserver is installed.
+    if os.getenv("TEST_DB_HOST"):
+        return {
+            "DB_HOST": os.environ["TEST_DB_HOST"],
+            "DB_USER": os.getenv("TEST_DB_USER", "postgres"),
+            "DB_PASSWORD": os.getenv("TEST_DB_PASSWORD", "postgres"),
+            "DB_NAME": os.getenv("TEST_DB_NAME", TEST_DB_NAME),
+        }, None
+    pgserver = pytest.importorskip("pgserver", reason="no TEST_DB_HOST and pgserver is not installed")
+    server = pgserver.get_server(os.path.join(tempfile.gettempdir(), "nulltrace-pgtest"), cleanup_mode="stop")
+    exists = server.psql(f"SELECT 1 FROM pg_database WHERE datname = '{TEST_DB_NAME}';")
+    if "(1 row)" not in exists:
+        server.psql(f"CREATE DATABASE {TEST_DB_NAME};")
+    uri = urlparse(server.get_uri())
+    return {
+        "DB_HOST": parse_qs(uri.query)["host"][0],
+        "DB_USER": uri.username or "postgres",
+        "DB_PASSWORD": uri.password or "",
+        "DB_NAME": TEST_DB_NAME,
+    }, server
+
+
+@pytest.fixture(scope="session")
+def database():
+    pytest.importorskip("psycopg2")
+    env, server = _start_server()
+    os.environ.update(env)
+    import db
+
+    yield db
+    db.listener.stop(5)
+    db.get_pool().closeall()
+    if server is not None:
+        server.cleanup()
+
+
+@pytest.fixture
+def fresh_db(database):
+    # A freshly created schema per test: db.sql, then the runtime migrations.
+    import cache
+    from schema import ensure_schema
+
+    with open(os.path.join(BACKEND, "db.sql")) as f:
+        # gen_random_uuid() is built in since PostgreSQL 13 and the embedded
+        # server ships without contrib extensions.
+        sql = f.read().replace('CREATE EXTENSION IF NOT EXISTS "pgcrypto";', "")
+    with database.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+    ensure_schema()
+    for c in cache.caches.values():
+        c.invalidate()
+    return database
+
+
+@pytest.fixture
+def client(fresh_db, monkeypatch):
+    # create_app() builds the per-process services once; the ledger is
+    # rebuilt per test because its store remembers the (dropped) genesis row.
+    for name, value in {"SCHEMA_ON_START": "0", "ANALYTICS_BACKFILL_ON_START": "0", "LEDGER_STORE": "postgres"}.items():
+        monkeypatch.setenv(name, value)
+    import app
+    from blockchain import Blockchain, PostgresStore
+    from verify import ChainVerifier
+
+    flask_app = app.create_app()
+    chain = Blockchain(PostgresStore(), batch_size=1)
+    monkeypatch.setattr(app, "blockchain", chain)
+    monkeypatch.setattr(app, "verifier", ChainVerifier(chain))
+    monkeypatch.setattr(app.scoring_workers, "blockchain", chain)
+    # Round-trip budgets are asserted on the debug header.
+    monkeypatch.setattr(app, "DB_ROUND_TRIP_HEADER", True)
+    return flask_app.test_client()
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+import pytest
+
+from batching import MicroBatcher
+
+
+class Recorder:
+    def __init__(self, fn=lambda xs: [x * 2 for x in xs]):
+        self.fn = fn
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        return self.fn(items)
+
+
+def test_requests_are_merged_up_to_max_batch_size():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=4, max_wait=0.5)
+    try:
+        assert batcher.map(range(10), timeout=5) == [x * 2 for x in range(10)]
+    finally:
+        batcher.close(5)
+    assert [len(b) for b in fn.batches] == [4, 4, 2]
+    assert [x for b in fn.batches for x in b] == list(range(10))
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=100, max_wait=0.05)
+    try:
+        started = time.monotonic()
+        assert batcher.submit(21).result(timeout=5) == 42
+        elapsed = time.monotonic() - started
+    finally:
+        batcher.close(5)
+    assert fn.batches == [[21]]
+    assert 0.04 <= elapsed < 2
+
+
+def test_each_caller_gets_its_own_result():
+    batcher = MicroBatcher(Recorder(lambda xs: [f"r{x}" for x in xs]), max_batch_size=8, max_wait=0.05)
+    results = {}
+
+    def call(i):
+        results[i] = batcher.submit(i).result(timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(32)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+    finally:
+        batcher.close(5)
+    assert results == {i: f"r{i}" for i in range(32)}
+
+
+def test_exception_reaches_every_waiter():
+    def fail(items):
+        raise ValueError("model exploded")
+
+    fn = Recorder(fail)
+    batcher = MicroBatcher(fn, max_batch_size=3, max_wait=0.5)
+    try:
+        futures = [batcher.submit(i) for i in range(3)]
+        errors = [f.exception(timeout=5) for f in futures]
+    finally:
+        batcher.close(5)
+    # The merged batch, then each item alone.
+    assert [len(b) for b in fn.batches] == [3, 1, 1, 1]
+    assert all(isinstance(e, ValueError) and str(e) == "model exploded" for e in errors)
+
+
+def test_bad_input_only_fails_its_own_caller():
+    def predict(items):
+        if "too long" in items:
+            raise IndexError("index out of range in self")
+        return [x.upper() for x in items]
+
+    fn = Recorder(predict)
+    batcher = MicroBatcher(fn, max_batch_size=3, max_wait=0.5)
+    try:
+        futures = [batcher.submit(x) for x in ("good", "too long", "fine")]
+        outcomes = [f.exception(timeout=5) or f.result() for f in futures]
+    finally:
+        batcher.close(5)
+    assert outcomes[0] == "GOOD" and outcomes[2] == "FINE"
+    assert isinstance(outcomes[1], IndexError)
+    assert batcher.stats()["retried_batches"] == 1
+
+
+def test_closed_batcher_rejects_submissions():
+    batcher = MicroBatcher(Recorder(), max_batch_size=2, max_wait=0.01)
+    assert batcher.submit(1).result(timeout=5) == 2
+    batcher.close(5)
+    with pytest.raises(RuntimeError):
+        batcher.submit(2)
+
+
+# Opt-in: SENTIMENT_TEST_MODEL_DIR=<small local checkpoint, e.g. from `python ai.py download`>.
+@pytest.mark.skipif(not os.getenv("SENTIMENT_TEST_MODEL_DIR"), reason="SENTIMENT_TEST_MODEL_DIR not set")
+def test_batched_model_matches_unbatched(monkeypatch):
+    pytest.importorskip("transformers")
+    ai = pytest.importorskip("ai")
+    monkeypatch.setattr(ai, "OFFLINE", True)
+    model = ai.load_model(source=os.environ["SENTIMENT_TEST_MODEL_DIR"], quantize=False)
+    texts = ["I love it", "this is terrible", "it is fine I guess", "best purchase ever", "never again"]
+
+    def predict(batch):
+        return [ai.to_rating(o["label"], o["score"]) for o in model(batch, batch_size=len(batch), truncation=True, max_length=ai.MAX_TOKENS, padding=True)]
+
+    fn = Recorder(predict)
+    batcher = MicroBatcher(fn, max_batch_size=4, max_wait=0.2)
+    try:
+        batched = batcher.map(texts, timeout=60)
+    finally:
+        batcher.close(5)
+    single = [predict([t])[0] for t in texts]
+    assert max(len(b) for b in fn.batches) > 1
+    for a, b in zip(batched, single):
+        assert a["label"] == b["label"]
+        assert a["score"] == pytest.approx(b["score"], abs=1e-4)
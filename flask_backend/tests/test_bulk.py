@@ -0,0 +1,73 @@
+import pytest
+
+TARGET = "00000000-0000-0000-0000-000000000200"
+USER = "00000000-0000-0000-0000-000000000001"
+
+
+def ledger_blocks(db):
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT height, data FROM ledger_blocks WHERE height > 0 ORDER BY height;")
+            return cur.fetchall()
+
+
+def test_bulk_opinions_are_sealed_as_one_block(client, fresh_db):
+    rows = [{"target_id": TARGET, "submitted_by": USER, "content": f"great product {i}"} for i in range(300)]
+    rows.append({"target_id": "not-a-uuid", "content": "bad row"})
+    resp = client.post("/api/opinions/bulk", json=rows)
+    assert resp.status_code == 200
+    assert resp.json["inserted"] == 300 and resp.json["failed"] == 1
+    # Independent of the row count: COPYs plus one ledger append.
+    assert int(resp.headers["X-DB-Round-Trips"]) < 20
+    blocks = ledger_blocks(fresh_db)
+    assert len(blocks) == 1 and blocks[0][1]["type"] == "batch" and blocks[0][1]["count"] == 300
+
+    proof = client.get(f"/api/admin/chain/proof/{resp.json['results'][7]['opinion_id']}?username=admin")
+    assert proof.status_code == 200 and proof.json["valid"]
+
+
+def test_bulk_feedback_is_sealed_as_one_block(client, fresh_db):
+    rows = [{"submitted_by": USER, "content": f"works well {i}"} for i in range(50)]
+    resp = client.post("/api/feedback/bulk", json=rows)
+    assert resp.status_code == 200 and resp.json["inserted"] == 50
+    assert int(resp.headers["X-DB-Round-Trips"]) < 20
+    blocks = ledger_blocks(fresh_db)
+    assert len(blocks) == 1 and blocks[0][1]["count"] == 50
+
+
+def test_scoring_worker_seals_each_claimed_batch(client, fresh_db):
+    import app
+
+    rows = [{"target_id": TARGET, "content": f"queued {i}"} for i in range(20)]
+    resp = client.post("/api/opinions/bulk?async=1", json=rows)
+    assert resp.json["inserted"] == 20
+    workers = app.scoring_workers
+    processed = 0
+    while True:
+        n = workers.run_once()
+        if not n:
+            break
+        processed += n
+    assert processed == 20
+    blocks = ledger_blocks(fresh_db)
+    assert [b[1]["count"] for b in blocks] == [workers.batch_size, 20 - workers.batch_size]
+
+
+@pytest.mark.parametrize("path,row", [
+    ("/api/opinions/bulk", {"target_id": TARGET, "content": "scored first"}),
+    ("/api/feedback/bulk", {"submitted_by": USER, "content": "scored first"}),
+])
+def test_bulk_rows_are_scored_before_the_transaction(client, fresh_db, monkeypatch, path, row):
+    import app
+
+    held = []
+    score_many = app.scorer.score_many
+
+    def recording(texts, timeout=None):
+        held.append(fresh_db.get_pool().stats()["in_use"])
+        return score_many(texts, timeout=timeout)
+
+    monkeypatch.setattr(app.scorer, "score_many", recording)
+    resp = client.post(path, json=[row] * 3)
+    assert resp.status_code == 200 and resp.json["inserted"] == 3
+    assert held == [0]
@@ -0,0 +1,71 @@
+import queue
+import threading
+from datetime import datetime, timezone
+
+import events
+
+TARGET = "00000000-0000-0000-0000-000000000200"
+
+
+def read_frames(body, out):
+    # The response iterator blocks between events, so it is drained on its own thread.
+    try:
+        for chunk in body:
+            out.put(chunk.decode() if isinstance(chunk, bytes) else chunk)
+    except Exception as e:
+        out.put(e)
+
+
+def next_frame(frames, match, timeout=10):
+    while True:
+        frame = frames.get(timeout=timeout)
+        assert not isinstance(frame, Exception), frame
+        if match in frame:
+            return frame
+
+
+def test_stream_opens_while_cache_listener_is_running(client, fresh_db, monkeypatch):
+    # The cache listener is already blocked in select() on its connection
+    # when the first stream subscribes to another channel.
+    connected = threading.Event()
+    fresh_db.listener.subscribe("test_listener_running", lambda payload: None, on_reconnect=connected.set)
+    assert connected.wait(10)
+    broadcaster = events.Broadcaster()
+    monkeypatch.setattr(events, "broadcaster", broadcaster)
+
+    resp = client.get("/api/opinions/stream", buffered=False)
+    assert resp.status_code == 200
+    frames = queue.Queue()
+    reader = threading.Thread(target=read_frames, args=(resp.response, frames), daemon=True)
+    reader.start()
+    assert next_frame(frames, "retry:").startswith("retry:")
+    assert broadcaster.ready.wait(10)
+
+    posted = client.post("/api/opinions", json={"target_id": TARGET, "content": "streamed opinion"})
+    assert posted.status_code in (200, 201)
+    frame = next_frame(frames, "event: opinion")
+    assert "streamed opinion" in frame
+    # Closing the broadcaster ends the stream, which releases the subscriber.
+    broadcaster.close()
+    reader.join(10)
+    resp.close()
+    assert broadcaster.subscriber_count() == 0
+
+
+def test_replay_failure_resets_and_closes_the_stream(client, monkeypatch):
+    import db
+    from pagination import encode_cursor
+
+    def unavailable(cursor, kinds):
+        raise db.PoolTimeout("connection pool exhausted")
+
+    broadcaster = events.Broadcaster()
+    broadcaster.ready.set()
+    monkeypatch.setattr(events, "broadcaster", broadcaster)
+    monkeypatch.setattr(events, "fetch_since", unavailable)
+    cursor = encode_cursor(datetime.now(timezone.utc), "00000000-0000-0000-0000-000000000001")
+    resp = client.get("/api/opinions/stream", headers={"Last-Event-ID": cursor})
+    assert resp.status_code == 200
+    assert resp.get_data(as_text=True) == f"retry: {events.SSE_RETRY_MS}\n\nevent: reset\ndata: {{}}\n\n"
+    resp.close()
+    assert broadcaster.subscriber_count() == 0
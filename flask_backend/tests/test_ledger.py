@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from blockchain import Blockchain, MemoryStore, PostgresStore
+from verify import ChainVerifier
+
+
+def submissions(n, start=0):
+    return [
+        {"type": "opinion", "opinion_id": f"00000000-0000-4000-8000-{i:012d}", "sentiment": "positive", "rating": 4, "content": f"opinion {i}"}
+        for i in range(start, start + n)
+    ]
+
+
+def test_full_audit_detects_tampered_memory_batch():
+    chain = Blockchain(MemoryStore(), batch_size=1)
+    chain.add_batch(submissions(5))
+    verifier = ChainVerifier(chain)
+    assert verifier.audit(mode="full")["valid"]
+    chain.store.items[1][2]["rating"] = 1
+    result = verifier.audit(mode="full")
+    assert not result["valid"] and result["bad_height"] == 1
+
+
+def test_full_audit_rebuilds_merkle_roots_from_ledger_refs(fresh_db):
+    chain = Blockchain(PostgresStore(), batch_size=1)
+    chain.add_block({"type": "opinion", "opinion_id": "00000000-0000-4000-8000-000000000999", "content": "single"})
+    chain.add_batch(submissions(7))
+    chain.add_batch(submissions(3, start=7))
+    verifier = ChainVerifier(chain)
+    assert verifier.audit(mode="full")["valid"]
+
+    with fresh_db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE ledger_refs SET data = jsonb_set(data, '{rating}', '1') WHERE height = 3 AND position = 1;"
+            )
+    result = verifier.audit(mode="full")
+    assert not result["valid"] and result["bad_height"] == 3
+    # Only the block headers are re-hashed by the cheaper modes.
+    assert verifier.audit(mode="incremental")["valid"]
+
+
+@pytest.mark.parametrize("change", [
+    "UPDATE ledger_refs SET leaf = md5(leaf) || md5(leaf) WHERE height = 2 AND position = 0;",
+    "DELETE FROM ledger_refs WHERE height = 2 AND position = 6;",
+])
+def test_full_audit_detects_tampered_leaves(fresh_db, change):
+    chain = Blockchain(PostgresStore(), batch_size=1)
+    chain.add_block({"type": "opinion", "opinion_id": "00000000-0000-4000-8000-000000000999", "content": "single"})
+    chain.add_batch(submissions(7))
+    with fresh_db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(change)
+    result = ChainVerifier(chain).audit(mode="full")
+    assert not result["valid"] and result["bad_height"] == 2
+
+
+def test_batch_in_caller_transaction_rolls_back_with_it(fresh_db):
+    chain = Blockchain(PostgresStore(), batch_size=1)
+    tip = chain.get_last_block().index
+    with pytest.raises(RuntimeError):
+        with fresh_db.get_conn() as conn:
+            with conn.cursor() as cur:
+                fresh_db.round_trips.count = 0
+                chain.add_batch(submissions(500), cur)
+                # Lock, genesis check, tip, block and refs, whatever the batch size.
+                assert fresh_db.round_trips.count <= 5
+                raise RuntimeError("abort the request")
+    assert chain.get_last_block().index == tip
+    block = chain.add_batch(submissions(500))
+    assert block.index == tip + 1 and block.data["count"] == 500
+
+
+def test_sealer_batches_single_submissions():
+    chain = Blockchain(MemoryStore(), batch_size=4, batch_ms=5)
+    for item in submissions(6):
+        chain.add_block(item)
+    # The first four fill a batch and are sealed by the submitting thread.
+    assert chain.get_last_block().data["count"] == 4
+    deadline = time.monotonic() + 5
+    while chain.get_last_block().index < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert chain.get_last_block().data["count"] == 2
+    chain.flush()
+
+
+def test_sealer_keeps_items_when_sealing_fails(monkeypatch):
+    store = MemoryStore()
+    chain = Blockchain(store, batch_size=100, batch_ms=60_000)
+    append_batch = store.append_batch
+
+    def unavailable(items, timestamp, cur=None):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(store, "append_batch", unavailable)
+    chain.add_block(submissions(1)[0])
+    with pytest.raises(RuntimeError):
+        chain.sealer.flush()
+    monkeypatch.setattr(store, "append_batch", append_batch)
+    chain.add_block(submissions(1, start=1)[0])
+    block = chain.sealer.flush()
+    assert [item["opinion_id"] for item in store.items[block.index]] == [s["opinion_id"] for s in submissions(2)]
+    chain.flush()
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import metrics
+
+
+def worker_registry(requests, latency, threads):
+    reg = metrics.Registry()
+    reg.counter("requests", "Requests.", ("route",)).labels("/a").inc(requests)
+    reg.histogram("latency_seconds", "Latency.").observe(latency)
+    reg.gauge("busy_threads", "Busy threads.", lambda: threads)
+    return reg
+
+
+def snapshot(directory, pid, reg):
+    metrics.write_snapshot(str(directory), reg)
+    os.replace(directory / f"{os.getpid()}.json", directory / f"{pid}.json")
+
+
+def test_snapshots_from_every_worker_are_merged(tmp_path):
+    snapshot(tmp_path, 101, worker_registry(3, 0.002, 5))
+    snapshot(tmp_path, 102, worker_registry(4, 0.2, 7))
+    text = metrics._format(metrics.merge_snapshots(str(tmp_path)))
+    assert 'requests_total{route="/a"} 7.0' in text
+    assert "latency_seconds_count 2" in text
+    assert 'latency_seconds_bucket{le="0.0025"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert 'busy_threads{pid="101"} 5' in text and 'busy_threads{pid="102"} 7' in text
+
+
+def test_exited_worker_keeps_its_counts_but_not_its_gauges(tmp_path):
+    snapshot(tmp_path, 101, worker_registry(3, 0.002, 5))
+    snapshot(tmp_path, 102, worker_registry(4, 0.2, 7))
+    metrics.mark_process_dead(101, str(tmp_path))
+    text = metrics._format(metrics.merge_snapshots(str(tmp_path)))
+    assert 'requests_total{route="/a"} 7.0' in text
+    assert 'pid="101"' not in text and 'busy_threads{pid="102"} 7' in text
+    metrics.clear_snapshots(str(tmp_path))
+    assert metrics.merge_snapshots(str(tmp_path)) == []
+
+
+def test_single_process_render_is_unchanged():
+    text = worker_registry(3, 0.002, 5).render()
+    assert 'requests_total{route="/a"} 3.0' in text
+    assert "busy_threads 5" in text
+
+
+def test_metrics_endpoint_merges_the_directory(client, monkeypatch, tmp_path):
+    snapshot(tmp_path, 101, worker_registry(3, 0.002, 5))
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    text = resp.get_data(as_text=True)
+    assert 'requests_total{route="/a"} 3.0' in text
+    # The serving worker's own snapshot is refreshed for the scrape.
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+    assert f'sse_subscribers{{pid="{os.getpid()}"}} 0' in text
+
+
+def test_metrics_endpoint_is_restricted(client, monkeypatch):
+    import app
+
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.7"}).status_code == 403
+    monkeypatch.setattr(app, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 403
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"}, environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert resp.status_code == 200
+
+
+def test_debug_defaults_are_off():
+    # Module defaults as deployed, without the conftest overrides.
+    env = {k: v for k, v in os.environ.items() if k not in ("DB_ROUND_TRIP_HEADER", "METRICS_TOKEN", "METRICS_ALLOW")}
+    out = subprocess.run(
+        [sys.executable, "-c", "import app; print(app.DB_ROUND_TRIP_HEADER, [str(n) for n in app.METRICS_ALLOW])"],
+        cwd=os.path.dirname(metrics.__file__), env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    assert out.strip() == "False ['127.0.0.1/32', '::1/128']"
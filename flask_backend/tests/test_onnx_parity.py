@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+# Opt-in: SENTIMENT_TEST_MODEL_DIR=<small local checkpoint, e.g. from `python ai.py download`>.
+pytestmark = pytest.mark.skipif(not os.getenv("SENTIMENT_TEST_MODEL_DIR"), reason="SENTIMENT_TEST_MODEL_DIR not set")
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    for name in ("numpy", "onnxruntime", "torch", "transformers"):
+        pytest.importorskip(name)
+    import onnx_backend
+
+    target = str(tmp_path_factory.mktemp("onnx"))
+    onnx_backend.export(os.environ["SENTIMENT_TEST_MODEL_DIR"], target, quantize=True, offline=True)
+    return onnx_backend, target
+
+
+@pytest.fixture
+def checkpoint(monkeypatch):
+    import ai
+
+    monkeypatch.setattr(ai, "MODEL_DIR", os.environ["SENTIMENT_TEST_MODEL_DIR"])
+    monkeypatch.setattr(ai, "OFFLINE", True)
+
+
+def test_onnx_matches_torch(exported, checkpoint):
+    onnx_backend, target = exported
+    report = onnx_backend.parity(model_dir=target, tolerance=1e-3)
+    assert report["mismatches"] == []
+    assert report["max_score_diff"] <= 1e-3
+    assert report["ok"] and report["texts"] == len(onnx_backend.PARITY_TEXTS)
+
+
+def test_quantized_onnx_agrees_on_labels(exported, checkpoint):
+    onnx_backend, target = exported
+    report = onnx_backend.parity(quantize=True, model_dir=target)
+    assert report["mismatches"] == []
+    assert report["ok"]
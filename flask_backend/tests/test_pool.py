@@ -0,0 +1,44 @@
+import os
+import threading
+import time
+
+
+def make_pool(db, **kwargs):
+    return db.ConnectionPool(
+        dbname=os.environ["DB_NAME"], user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"], host=os.environ["DB_HOST"], **kwargs
+    )
+
+
+def test_liveness_ping_does_not_hold_the_pool_lock(database):
+    pool = make_pool(database, minconn=0, maxconn=2, ping_after=0)
+    slow, fast = pool.getconn(), pool.getconn()
+    pool.putconn(fast)
+    pool.putconn(slow)  # popped first by the next checkout
+    cursor = slow.cursor
+    pinging = threading.Event()
+
+    def slow_cursor(*args, **kwargs):
+        # Stands in for a ping to a server that is slow to answer.
+        pinging.set()
+        time.sleep(0.5)
+        return cursor(*args, **kwargs)
+
+    slow.cursor = slow_cursor
+    checked_out = []
+    t = threading.Thread(target=lambda: checked_out.append(pool.getconn()))
+    t.start()
+    try:
+        assert pinging.wait(5)
+        started = time.monotonic()
+        conn = pool.getconn()
+        pool.stats()
+        assert time.monotonic() - started < 0.4
+        assert conn is fast
+        pool.putconn(conn)
+    finally:
+        t.join(5)
+    assert checked_out == [slow]
+    pool.putconn(slow)
+    pool.closeall()
+    assert pool.stats()["size"] == 0
@@ -0,0 +1,38 @@
+import re
+
+import pytest
+
+pytest.importorskip("emoji")
+pytest.importorskip("cleantext")
+import ai  # noqa: E402
+
+CASES = [
+    ("i can't believe it's not butter!", ["i", "cant", "believe", "its", "not", "butter"]),
+    ("hello, world. bye!", ["hello", "world", "bye"]),
+    ("wow:so good", ["wow", ":", "so", "good"]),
+    ("time: 10:30", ["time", ":", ":"]),
+    (":red_heart: :fire:", [":", "redheart", ":", ":", "fire", ":"]),
+    # Adjacent emoji: the second colon sticks to the next word, as in word_tokenize.
+    ("love it:fire::fire:", ["love", "it", ":", "fire", ":", ":fire", ":"]),
+    ("i cannot gonna gimme lemme gotta", ["i", "can", "not", "gon", "na", "gim", "me", "lem", "me", "got", "ta"]),
+    ("Cannot GONNA", ["Can", "not", "GON", "NA"]),
+    ("wanna go, then wanna", ["wan", "na", "go", "then", "wan", "na"]),
+    ("wannabe gonnae", ["wannabe", "gonnae"]),
+    ("don't won't y'all", ["dont", "wont", "yall"]),
+    ("e-mail tl;dr ok:)", ["email", "tldr", "ok", ":"]),
+    ("  \t\n", []),
+]
+
+
+@pytest.mark.parametrize("text,tokens", CASES)
+def test_tokenize(text, tokens):
+    assert ai.tokenize(text) == tokens
+
+
+@pytest.mark.parametrize("text,tokens", CASES)
+def test_tokenize_matches_word_tokenize(text, tokens):
+    # NLTKWordTokenizer is word_tokenize minus sentence splitting, which
+    # stripped text (no . ! ?) never triggers; it needs no punkt data.
+    destructive = pytest.importorskip("nltk.tokenize.destructive")
+    stripped = re.sub(r"\s+", " ", re.sub(r"[^a-zA-Z\s:]", "", text)).strip()
+    assert destructive.NLTKWordTokenizer().tokenize(stripped) == ai.tokenize(text)
@@ -0,0 +1,79 @@
+from schema import backfill_analytics, ensure_schema
+
+ENGINE = "00000000-0000-0000-0000-000000000100"
+
+
+def insert_legacy(db, results):
+    # Rows written before the typed columns existed; the rollup trigger is
+    # bypassed because it did not exist either.
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL session_replication_role = replica;")
+            for result in results:
+                cur.execute("INSERT INTO analytics (result, engine_id) VALUES (%s, %s);", (result, ENGINE))
+
+
+def typed_columns(db):
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT result->>'note', sentiment, rating FROM analytics WHERE result ? 'note' ORDER BY 1;")
+            return cur.fetchall()
+
+
+def test_backfill_visits_each_row_once(fresh_db):
+    insert_legacy(fresh_db, [
+        '{"note": "a", "sentiment": "positive", "rating": 5}',
+        '{"note": "b", "sentiment": null, "rating": 3}',
+        '{"note": "c", "sentiment": "negative", "rating": "two"}',
+        '{"note": "d", "sentiment": "neutral", "rating": 99999}',
+        '{"note": "e", "sentiment": "neutral", "rating": "3"}',
+        '{"note": "f", "rating": 4}',
+    ])
+    # Batches smaller than the row count, so the keyset has to advance past the NULL row.
+    assert backfill_analytics(batch_size=2) == 5
+    assert typed_columns(fresh_db) == [
+        ("a", "positive", 5),
+        ("b", None, 3),
+        ("c", "negative", None),
+        ("d", "neutral", None),
+        ("e", "neutral", 3),
+        ("f", None, None),
+    ]
+    assert backfill_analytics(batch_size=2) == 1  # only "b" still matches, and it is visited once
+
+
+MALFORMED = [
+    '{"note": "g", "sentiment": "positive", "rating": 4}',
+    '{"note": "h", "sentiment": "positive", "rating": "four"}',
+    '{"note": "i", "sentiment": null, "rating": 2}',
+    '{"note": "j", "sentiment": "negative", "rating": 99999999999}',
+]
+
+
+def rollups(db):
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT sentiment, count, rating_sum FROM sentiment_rollups WHERE bucket_size = 'day' ORDER BY 1;")
+            return cur.fetchall()
+
+
+def test_rollup_trigger_skips_malformed_results(fresh_db):
+    with fresh_db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM sentiment_rollups;")
+            for result in MALFORMED:
+                cur.execute("INSERT INTO analytics (result, engine_id) VALUES (%s, %s);", (result, ENGINE))
+    assert rollups(fresh_db) == [("negative", 1, 0), ("positive", 2, 4)]
+
+
+def test_stats_backfill_skips_malformed_results(fresh_db):
+    with fresh_db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM analytics;")
+    insert_legacy(fresh_db, MALFORMED)
+    with fresh_db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE stats_counters, sentiment_rollups;")
+    # A schema without the stats tables backfills them from analytics on start.
+    ensure_schema()
+    assert rollups(fresh_db) == [("negative", 1, 0), ("positive", 2, 4)]
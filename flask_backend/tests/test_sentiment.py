@@ -0,0 +1,12 @@
+from sentiment import Scorer
+
+
+def test_process_executor_spawns_its_children():
+    scorer = Scorer(primary="textblob", fallback="roberta", executor="process", workers=1, timeout=60)
+    try:
+        assert scorer._executor._mp_context.get_start_method() == "spawn"
+        results, engine = scorer.score_many(["I love this", "this is awful"])
+    finally:
+        scorer.shutdown()
+    assert engine.name == "TextBlob"
+    assert [r["sentiment"] for r in results] == ["positive", "negative"]
@@ -0,0 +1,45 @@
+from sentiment import Scorer, get_engine
+from worker import ScoringWorkers
+
+TARGET = "00000000-0000-0000-0000-000000000200"
+
+
+class RecordingScorer(Scorer):
+    def __init__(self):
+        super().__init__(executor="inline")
+        self.timeouts = []
+
+    def score_many(self, texts, timeout=None):
+        self.timeouts.append(timeout)
+        return [get_engine("textblob").score(t) for t in texts], self.primary
+
+
+def test_worker_batches_get_the_worker_timeout(client):
+    import app
+
+    scorer = RecordingScorer()
+    workers = ScoringWorkers(scorer, app.blockchain, batch_size=4, score_timeout=42)
+    resp = client.post("/api/opinions/bulk?async=1", json=[{"target_id": TARGET, "content": f"queued {i}"} for i in range(6)])
+    assert resp.json["inserted"] == 6
+    while workers.run_once():
+        pass
+    assert scorer.timeouts == [42, 42]
+
+
+def test_expired_lease_is_not_reclaimed_past_max_attempts(client, fresh_db):
+    import app
+
+    resp = client.post("/api/opinions/bulk?async=1", json=[{"target_id": TARGET, "content": f"crashes its worker {i}"} for i in range(2)])
+    assert resp.json["inserted"] == 2
+    with fresh_db.get_conn() as conn:
+        with conn.cursor() as cur:
+            # Both leases expired; one job has already used every attempt.
+            cur.execute("UPDATE scoring_jobs SET status = 'running', locked_at = NOW() - INTERVAL '1 hour', attempts = 2;")
+            cur.execute("UPDATE scoring_jobs SET attempts = 3 WHERE job_id = (SELECT MIN(job_id) FROM scoring_jobs);")
+    workers = ScoringWorkers(RecordingScorer(), app.blockchain, max_attempts=3)
+    assert workers.run_once() == 1
+    assert workers.run_once() == 0
+    with fresh_db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT status, attempts, last_error FROM scoring_jobs;")
+            assert cur.fetchall() == [("failed", 3, "lease expired on the last attempt")]
@@ -0,0 +1,136 @@
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from blockchain import MemoryStore, genesis_block
+from merkle import leaf_hash, merkle_root
+from metrics import registry
+
+AUDIT_WORKERS = int(os.getenv("LEDGER_AUDIT_WORKERS", str(os.cpu_count() or 1)))
+AUDIT_MIN_RANGE = int(os.getenv("LEDGER_AUDIT_MIN_RANGE", "10000"))
+
+verify_seconds = registry.histogram("ledger_verify_duration_seconds", "Chain verification time by mode.", ("mode",), buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900))
+verified_blocks = registry.counter("ledger_verified_blocks", "Blocks re-hashed by verification, by mode.", ("mode",))
+
+
+def _batch_intact(block, refs, ref):
+    # Rebuilds a batch block's Merkle root from its stored submissions.
+    # `ref` is the next unconsumed row of `refs`; returns (ok, next ref).
+    leaves = []
+    while ref is not None and ref[0] < block.index:
+        ref = next(refs, None)
+    while ref is not None and ref[0] == block.index:
+        _, position, leaf, data = ref
+        if position != len(leaves) or leaf != leaf_hash(data):
+            return False, ref
+        leaves.append(leaf)
+        ref = next(refs, None)
+    return len(leaves) == block.data.get("count") and merkle_root(leaves) == block.data.get("merkle_root"), ref
+
+
+def verify_range(store, start, end, prev_hash=None, merkle=False):
+    # Checks links and hashes inside [start, end), and with `merkle` also the
+    # submissions behind each batch block. The caller stitches ranges together
+    # by comparing each range's first prev_hash with the previous range's last hash.
+    first_prev = last_hash = None
+    expected = start
+    count = 0
+    refs = iter(store.batch_refs(start, end)) if merkle else None
+    ref = next(refs, None) if merkle else None
+    for block in store.range(start, end):
+        if block.index != expected:
+            return {"start": start, "end": end, "count": count, "bad_height": expected}
+        if count == 0:
+            first_prev = block.prev_hash
+            if block.index == 0 and block.hash != genesis_block().hash:
+                return {"start": start, "end": end, "count": count, "bad_height": 0}
+            if prev_hash is not None and block.prev_hash != prev_hash:
+                return {"start": start, "end": end, "count": count, "bad_height": block.index}
+        elif block.prev_hash != last_hash:
+            return {"start": start, "end": end, "count": count, "bad_height": block.index}
+        if block.hash != block.calc_hash():
+            return {"start": start, "end": end, "count": count, "bad_height": block.index}
+        if merkle and isinstance(block.data, dict) and block.data.get("type") == "batch":
+            ok, ref = _batch_intact(block, refs, ref)
+            if not ok:
+                return {"start": start, "end": end, "count": count, "bad_height": block.index}
+        last_hash = block.hash
+        expected += 1
+        count += 1
+    if end is not None and expected != end:
+        return {"start": start, "end": end, "count": count, "bad_height": expected}
+    return {"start": start, "end": expected, "count": count, "bad_height": None, "first_prev_hash": first_prev, "last_hash": last_hash}
+
+
+def _report(mode, result, started, from_height, to_height):
+    elapsed = time.perf_counter() - started
+    verify_seconds.labels(mode).observe(elapsed)
+    verified_blocks.labels(mode).inc(result["checked"])
+    result.update({
+        "mode": mode,
+        "from_height": from_height,
+        "to_height": to_height,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "blocks_per_sec": round(result["checked"] / elapsed, 1) if elapsed > 0 else None,
+    })
+    return result
+
+
+class ChainVerifier:
+    def __init__(self, blockchain):
+        self.blockchain = blockchain
+
+    @property
+    def store(self):
+        return self.blockchain.store
+
+    def verify_incremental(self):
+        started = time.perf_counter()
+        checkpoint = self.store.load_checkpoint()
+        if checkpoint is None:
+            return self.audit(workers=1, mode="incremental")
+        height, cp_hash = checkpoint
+        anchor = self.store.get(height)
+        if anchor is None or anchor.hash != cp_hash:
+            return _report("incremental", {"valid": False, "checked": 0, "bad_height": height}, started, height, height)
+        r = verify_range(self.store, height + 1, None, prev_hash=cp_hash)
+        valid = r["bad_height"] is None
+        to_height = r["end"] - 1
+        if valid and r["count"]:
+            self.store.save_checkpoint(to_height, r["last_hash"])
+        return _report("incremental", {"valid": valid, "checked": r["count"], "bad_height": r["bad_height"]}, started, height + 1, to_height)
+
+    def audit(self, workers=None, mode="full"):
+        started = time.perf_counter()
+        tip = self.store.tip()
+        length = tip.index + 1
+        workers = max(1, workers or AUDIT_WORKERS)
+        size = max(AUDIT_MIN_RANGE, math.ceil(length / workers))
+        bounds = [(s, min(s + size, length)) for s in range(0, length, size)]
+        # A full audit also rebuilds every batch's Merkle root from ledger_refs.
+        merkle = mode == "full"
+        if len(bounds) > 1 and not isinstance(self.store, MemoryStore):
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(workers, len(bounds)), mp_context=ctx) as pool:
+                n = len(bounds)
+                results = list(pool.map(verify_range, [self.store] * n, [b[0] for b in bounds], [b[1] for b in bounds], [None] * n, [merkle] * n))
+        else:
+            results = [verify_range(self.store, s, e, merkle=merkle) for s, e in bounds]
+
+        checked, bad_height, prev = 0, None, None
+        for r in results:
+            checked += r["count"]
+            if r["bad_height"] is not None:
+                bad_height = r["bad_height"]
+                break
+            if prev is not None and r["first_prev_hash"] != prev["last_hash"]:
+                bad_height = r["start"]
+                break
+            prev = r
+        valid = bad_height is None
+        if valid and prev is not None:
+            self.store.save_checkpoint(prev["end"] - 1, prev["last_hash"])
+        result = {"valid": valid, "checked": checked, "bad_height": bad_height, "ranges": len(bounds)}
+        return _report(mode, result, started, 0, length - 1)
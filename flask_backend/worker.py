@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import traceback
+import uuid
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+import lookups
+from db import get_conn
+
+# An expired lease means the worker holding it died mid-batch (e.g. OOM). Such
+# a job is retried like a failed one, and given up on once its attempts are
+# used up, so a job that kills its worker cannot be re-claimed forever.
+CLAIM_SQL = """
+    WITH abandoned AS (
+        UPDATE scoring_jobs
+        SET status = 'failed', last_error = 'lease expired on the last attempt', locked_at = NULL
+        WHERE status = 'running' AND locked_at < NOW() - %(lease)s * INTERVAL '1 second'
+          AND attempts >= %(max_attempts)s
+    )
+    UPDATE scoring_jobs j
+    SET status = 'running', attempts = j.attempts + 1, locked_at = NOW()
+    FROM opinions o
+    WHERE o.opinion_id = j.opinion_id
+      AND j.job_id IN (
+        SELECT job_id FROM scoring_jobs
+        WHERE (status = 'pending' AND available_at <= NOW())
+           OR (status = 'running' AND locked_at < NOW() - %(lease)s * INTERVAL '1 second'
+               AND attempts < %(max_attempts)s)
+        ORDER BY available_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+      )
+    RETURNING j.job_id, j.opinion_id, j.attempts, o.content;
+"""
+
+
+def enqueue_opinion(cur, opinion_id):
+    cur.execute("INSERT INTO scoring_jobs (opinion_id) VALUES (%s) ON CONFLICT (opinion_id) DO NOTHING;", (opinion_id,))
+
+
+class ScoringWorkers:
+    def __init__(self, scorer, blockchain, workers=2, batch_size=16, poll_interval=0.5, max_attempts=5, lease_seconds=300, score_timeout=60):
+        self.scorer = scorer
+        self.blockchain = blockchain
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        # Nobody waits on a queued job, so a whole batch gets what a bulk chunk
+        # gets (bulk.py) instead of the per-request SENTIMENT_TIMEOUT_MS; it
+        # must stay below the lease or the batch is claimed twice.
+        self.score_timeout = score_timeout
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, scorer, blockchain):
+        return cls(
+            scorer,
+            blockchain,
+            workers=int(os.getenv("SCORING_WORKERS", "2")),
+            batch_size=int(os.getenv("SCORING_BATCH_SIZE", "16")),
+            poll_interval=float(os.getenv("SCORING_POLL_INTERVAL", "0.5")),
+            max_attempts=int(os.getenv("SCORING_MAX_ATTEMPTS", "5")),
+            score_timeout=float(os.getenv("SCORING_TIMEOUT", "60")),
+        )
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"scoring-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except psycopg2.Error:
+                traceback.print_exc()
+                processed = 0
+            if not processed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_once(self):
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(CLAIM_SQL, {"lease": self.lease_seconds, "max_attempts": self.max_attempts, "limit": self.batch_size})
+                jobs = cur.fetchall()
+        if not jobs:
+            return 0
+        try:
+            self._score(jobs)
+        except Exception as e:
+            self._fail(jobs, e)
+        return len(jobs)
+
+    def _score(self, jobs):
+        results, engine = self.scorer.score_many([j[3] for j in jobs], timeout=self.score_timeout)
+        now = datetime.now()
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                engine_id = lookups.engine_id(cur, engine)
+                execute_values(
+                    cur,
+                    "INSERT INTO analytics (analytics_id, result, sentiment, rating, engine_id, opinion_id, analyzed_at) VALUES %s;",
+                    [
+                        (str(uuid.uuid4()), json.dumps({"sentiment": r["sentiment"], "rating": r["rating"]}), r["sentiment"], r["rating"], engine_id, j[1], now)
+                        for j, r in zip(jobs, results)
+                    ],
+                )
+                cur.execute("DELETE FROM scoring_jobs WHERE job_id = ANY(%s);", ([j[0] for j in jobs],))
+                # One Merkle block per claimed batch, committed together with the scores.
+                self.blockchain.add_batch([{
+                    "type": "opinion",
+                    "opinion_id": j[1],
+                    "sentiment": r["sentiment"],
+                    "rating": r["rating"],
+                    "content": j[3],
+                    "timestamp": now.isoformat()
+                } for j, r in zip(jobs, results)], cur)
+
+    def _fail(self, jobs, error):
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                for job_id, _, attempts, _ in jobs:
+                    if attempts >= self.max_attempts:
+                        cur.execute(
+                            "UPDATE scoring_jobs SET status = 'failed', last_error = %s, locked_at = NULL WHERE job_id = %s;",
+                            (str(error), job_id),
+                        )
+                    else:
+                        cur.execute(
+                            "UPDATE scoring_jobs SET status = 'pending', last_error = %s, locked_at = NULL, "
+                            "available_at = NOW() + %s * INTERVAL '1 second' WHERE job_id = %s;",
+                            (str(error), 2 ** attempts, job_id),
+                        )
+
+
+if __name__ == "__main__":
+    from blockchain import Blockchain
+    from sentiment import Scorer
+
+    scorer = Scorer.from_env()
+    scorer.warmup()
+    pool = ScoringWorkers.from_env(scorer, Blockchain())
+    pool.start()
+    print(f"⚙️ {pool.workers} scoring workers running, Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pool.stop()
@@ -10,6 +10,35 @@ export default function AdminDashboard() {
   const [view, setView] = useState('overview')
   const [targetFilter, setTargetFilter] = useState('')
   const [sortOrder, setSortOrder] = useState('desc')
+  // Lists are paged newest first; X-Next-Cursor points at the next (older) page.
+  const [cursors, setCursors] = useState({ opinions: null, feedbacks: null })
+  const [loadingMore, setLoadingMore] = useState(false)
+
+  const withDefaults = f => ({ ...f, rating: f.rating ?? 3, sentiment: f.sentiment ?? 'neutral' })
+
+  const fetchPage = async (path, cursor) => {
+    const headers = { 'X-Username': localStorage.getItem('username') }
+    const res = await fetch(`${API}${path}${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`, { headers })
+    return { items: await res.json(), next: res.headers.get('X-Next-Cursor') }
+  }
+
+  const loadMore = async kind => {
+    if (!cursors[kind] || loadingMore) return
+    setLoadingMore(true)
+    try {
+      const key = kind === 'opinions' ? 'opinion_id' : 'response_id'
+      const page = await fetchPage(`/api/admin/${kind}`, cursors[kind])
+      const items = kind === 'opinions' ? page.items : page.items.map(withDefaults)
+      const append = prev => [...prev, ...items.filter(i => !prev.some(p => p[key] === i[key]))]
+      if (kind === 'opinions') setOpinions(append)
+      else setFeedbacks(append)
+      setCursors(c => ({ ...c, [kind]: page.next }))
+    } catch (err) {
+      console.error(`Failed to load more ${kind}:`, err)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
 
   useEffect(() => {
     const username = localStorage.getItem('username')
@@ -25,23 +54,51 @@ export default function AdminDashboard() {
 
         const [ov, op, fb] = await Promise.all([
           fetch(`${API}/api/admin/overview`, { headers }).then(r => r.json()),
-          fetch(`${API}/api/admin/opinions`, { headers }).then(r => r.json()),
-          fetch(`${API}/api/admin/feedbacks`, { headers }).then(r => r.json())
+          fetchPage('/api/admin/opinions'),
+          fetchPage('/api/admin/feedbacks')
         ])
 
         setOverview(ov)
-        setOpinions(op)
-        setFeedbacks(fb.map(f => ({
-          ...f,
-          rating: f.rating ?? 3,
-          sentiment: f.sentiment ?? 'neutral'
-        })))
+        setOpinions(op.items)
+        setFeedbacks(fb.items.map(withDefaults))
+        setCursors({ opinions: op.next, feedbacks: fb.next })
       } catch (err) {
         console.error('Failed to load admin data:', err)
       }
     }
 
     loadData()
+
+    // New rows and scores are pushed instead of re-fetching the lists; the
+    // browser resumes from the last event id whenever the stream reconnects.
+    const upsert = (key, row) => prev =>
+      prev.some(p => p[key] === row[key]) ? prev.map(p => (p[key] === row[key] ? row : p)) : [row, ...prev]
+
+    const source = new EventSource(`${API}/api/admin/stream?username=${encodeURIComponent(username)}`)
+    source.addEventListener('opinion', e => {
+      const o = JSON.parse(e.data)
+      setOpinions(upsert('opinion_id', {
+        opinion_id: o.id,
+        user: 'Anonymous',
+        target: o.target || 'Unknown',
+        content: o.content,
+        timestamp: o.timestamp,
+        sentiment: o.sentiment,
+        rating: o.rating
+      }))
+    })
+    source.addEventListener('score', e => {
+      const { opinion_id, sentiment, rating } = JSON.parse(e.data)
+      setOpinions(prev => prev.map(o => (o.opinion_id === opinion_id ? { ...o, sentiment, rating } : o)))
+    })
+    source.addEventListener('feedback', e => {
+      const f = JSON.parse(e.data)
+      setFeedbacks(upsert('response_id', withDefaults(f)))
+    })
+    // Sent when more was missed than the server replays.
+    source.addEventListener('reset', loadData)
+
+    return () => source.close()
   }, [API])
 
   if (!overview) return <p style={{ padding: 20 }}>Loading admin data...</p>
@@ -54,6 +111,17 @@ export default function AdminDashboard() {
       return sortOrder === 'asc' ? ra - rb : rb - ra
     })
 
+  const loadMoreButton = kind =>
+    cursors[kind] && (
+      <button
+        onClick={() => loadMore(kind)}
+        disabled={loadingMore}
+        style={{ background: '#111', color: '#22d3ee', padding: '6px 12px', borderRadius: 6, border: '1px solid #222', cursor: 'pointer' }}
+      >
+        {loadingMore ? 'Loading...' : 'Load more'}
+      </button>
+    )
+
   const sentimentColor = s => {
     if (s === 'positive') return { color: '#22c55e' }
     if (s === 'negative') return { color: '#ef4444' }
@@ -149,6 +217,7 @@ export default function AdminDashboard() {
               </div>
             ))
           )}
+          {loadMoreButton('opinions')}
         </section>
       )}
 
@@ -186,6 +255,7 @@ export default function AdminDashboard() {
               </div>
             ))
           )}
+          {loadMoreButton('feedbacks')}
         </section>
       )}
     </main>
@@ -1,6 +1,6 @@
 "use client";
 
-import React, { useState, useEffect, FormEvent } from "react";
+import React, { useState, useEffect, useRef, FormEvent } from "react";
 import { useRouter } from "next/navigation";
 
 interface Opinion {
@@ -26,9 +26,12 @@ export default function OpinionsPage() {
   const [selectedTarget, setSelectedTarget] = useState("");
   const [content, setContent] = useState("");
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState("");
   const [submitting, setSubmitting] = useState(false);
   const [username, setUsername] = useState<string | null>(null);
+  const live = useRef(false);
   const router = useRouter();
 
   const API = process.env.NEXT_PUBLIC_API_URL || "http://127.0.0.1:5000";
@@ -45,6 +48,7 @@ export default function OpinionsPage() {
       const opinions = await oRes.json();
       setTargets(targets);
       setOpinions(opinions);
+      setNextCursor(oRes.headers.get("X-Next-Cursor"));
     } catch (err) {
       setError("Failed to load data");
     } finally {
@@ -52,12 +56,65 @@ export default function OpinionsPage() {
     }
   };
 
+  // The list is paged (newest first); older pages are fetched on demand.
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetch(
+        `${API}/api/opinions?cursor=${encodeURIComponent(nextCursor)}`
+      );
+      if (!res.ok) throw new Error("Failed to load more opinions");
+      const older: Opinion[] = await res.json();
+      setOpinions((prev) => [
+        ...prev,
+        ...older.filter((o) => !prev.some((p) => p.id === o.id)),
+      ]);
+      setNextCursor(res.headers.get("X-Next-Cursor"));
+    } catch (err) {
+      setError(err instanceof Error ? err.message : "Failed to load more opinions");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     const storedUser = localStorage.getItem("username");
     if (storedUser) setUsername(storedUser);
     fetchData();
   }, []);
 
+  // New opinions and their scores are pushed over server-sent events; the
+  // browser reconnects and resumes from the last event id by itself.
+  useEffect(() => {
+    const source = new EventSource(`${API}/api/opinions/stream`);
+    source.onopen = () => {
+      live.current = true;
+    };
+    source.onerror = () => {
+      live.current = false;
+    };
+    source.addEventListener("opinion", (e) => {
+      const op: Opinion = JSON.parse((e as MessageEvent).data);
+      setOpinions((prev) =>
+        prev.some((o) => o.id === op.id)
+          ? prev.map((o) => (o.id === op.id ? op : o))
+          : [op, ...prev]
+      );
+    });
+    source.addEventListener("score", (e) => {
+      const { opinion_id, sentiment, rating } = JSON.parse(
+        (e as MessageEvent).data
+      );
+      setOpinions((prev) =>
+        prev.map((o) => (o.id === opinion_id ? { ...o, sentiment, rating } : o))
+      );
+    });
+    // Sent when more was missed than the server replays.
+    source.addEventListener("reset", () => fetchData());
+    return () => source.close();
+  }, []);
+
   const handleSubmit = async (e: FormEvent<HTMLFormElement>) => {
     e.preventDefault();
     if (submitting) return;
@@ -92,7 +149,7 @@ export default function OpinionsPage() {
 
       setContent("");
       setSelectedTarget("");
-      await fetchData();
+      if (!live.current) await fetchData();
     } catch (err) {
       setError(err instanceof Error ? err.message : "Failed to post opinion");
     } finally {
@@ -198,7 +255,8 @@ export default function OpinionsPage() {
         {/* Opinions list */}
         <section>
           <h2 className="text-2xl font-semibold mb-6">
-            Public Opinions ({opinions.length})
+            Public Opinions ({opinions.length}
+            {nextCursor ? "+" : ""})
           </h2>
 
           {loading ? (
@@ -255,6 +313,15 @@ export default function OpinionsPage() {
                   )}
                 </div>
               ))}
+              {nextCursor && (
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="w-full rounded-lg border border-zinc-800 py-2 text-sm text-blue-400 hover:text-blue-300 disabled:opacity-50"
+                >
+                  {loadingMore ? "Loading..." : "Load more"}
+                </button>
+              )}
             </div>
           )}
         </section>